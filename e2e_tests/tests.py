@@ -197,6 +197,20 @@ def test_list_services():
     ]
 
 
+def test_list_services_unhappy():
+    api_url = get_api_url()
+
+    resp1 = requests.get(
+        f"{api_url}/service", params={"since": "2000-01-01 01:00"}
+    )
+    assert resp1.status_code == 400
+    resp2 = requests.get(
+        f"{api_url}/service",
+        params={"since": "2000-01-01 02:00", "until": "2000-01-01 01:00"},
+    )
+    assert resp2.status_code == 400
+
+
 def test_create_appointment_get_appointment_detail_happy():
     account_name_s = "barber"
     password_s = "123"
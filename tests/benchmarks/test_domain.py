@@ -0,0 +1,179 @@
+"""Timing benchmarks for the domain hot paths.
+
+Skipped unless TIMETABLE_BENCHMARKS is set. Other knobs:
+
+- TIMETABLE_BENCHMARK_MAX_SIZE: largest calendar size to run (default 10^6)
+- TIMETABLE_BENCHMARK_THRESHOLD: allowed growth of a ratio against the
+  baseline (default 1.5, i.e. 50% worse fails)
+- TIMETABLE_BENCHMARK_NOISE: slowdowns below this many seconds per call are
+  never reported, as timer noise dominates them (default 5e-6)
+- TIMETABLE_BENCHMARK_SAVE: write the measured ratios as the new baseline
+
+Absolute timings differ from machine to machine, so every operation is
+timed on a calendar of the given size and on one of the smallest size in
+the same run, and only the ratio of the two is kept in the baseline. A
+ratio far above the baseline means the operation scales worse than it
+used to.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Callable, List
+
+import pytest
+
+from timetable.domain.calendar import Calendar
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("TIMETABLE_BENCHMARKS"),
+    reason="set TIMETABLE_BENCHMARKS=1 to run benchmarks",
+)
+
+BASELINE = Path(__file__).with_name("baseline.json")
+MAX_SIZE = int(os.environ.get("TIMETABLE_BENCHMARK_MAX_SIZE", 10**6))
+THRESHOLD = float(os.environ.get("TIMETABLE_BENCHMARK_THRESHOLD", 1.5))
+NOISE = float(os.environ.get("TIMETABLE_BENCHMARK_NOISE", 5e-6))
+SAVE = bool(os.environ.get("TIMETABLE_BENCHMARK_SAVE"))
+REFERENCE_SIZE = 10**2
+SIZES = [n for n in (10**3, 10**4, 10**5, 10**6) if n <= MAX_SIZE]
+START = datetime(2000, 1, 1)
+HOUR = timedelta(hours=1)
+CALLS = 200
+SEED = 42
+
+results = {}
+
+
+def make_calendar(size: int) -> Calendar:
+    """Calendar with ``size`` appointments booked through its public API.
+
+    Accepted appointments take even hours and pending ones odd hours, so
+    pending requests can always be accepted. Every appointment is the
+    latest one when it is created or accepted, which keeps building large
+    calendars cheap. A ten year block accepted before START makes sure
+    that one long appointment does not slow down the others.
+    """
+    rng = Random(SEED)
+    c = Calendar(owner="service")
+    c.accept_appointment(
+        c.create_appointment(
+            "client", START - timedelta(days=3650), START, "synthetic"
+        )
+    )
+    for i in range(size):
+        accepted = rng.random() < 0.5
+        since = START + (2 * i + (0 if accepted else 1)) * HOUR
+        a = c.create_appointment(
+            f"client{rng.randrange(1000)}", since, since + HOUR, "synthetic"
+        )
+        if accepted:
+            c.accept_appointment(a)
+    return c
+
+
+Operations = List[Callable[[], object]]
+
+
+def create_appointment(c: Calendar, rng: Random, calls: int) -> Operations:
+    def op():
+        i = rng.randrange(c.id_count)
+        since = START + (2 * i + 1) * HOUR
+        since += timedelta(minutes=rng.randrange(30))
+        until = since + timedelta(minutes=30)
+        return lambda: c.create_appointment("bench", since, until, "bench")
+
+    return [op() for _ in range(calls)]
+
+
+def is_available(c: Calendar, rng: Random, calls: int) -> Operations:
+    def op():
+        since = START + rng.randrange(2 * c.id_count) * HOUR
+        return lambda: c.is_available(since, since + HOUR)
+
+    return [op() for _ in range(calls)]
+
+
+def accept_appointment(c: Calendar, rng: Random, calls: int) -> Operations:
+    pending = [a for a in c.list_appointments() if not a.accepted]
+    return [
+        lambda a=a: c.accept_appointment(a)
+        for a in rng.sample(pending, min(calls, len(pending)))
+    ]
+
+
+def get_appointment(c: Calendar, rng: Random, calls: int) -> Operations:
+    ids = [a.id for a in c.list_appointments()]
+    return [
+        lambda id=id: c.get_appointment(id)
+        for id in (rng.choice(ids) for _ in range(calls))
+    ]
+
+
+def list_appointments(c: Calendar, rng: Random, calls: int) -> Operations:
+    return [c.list_appointments] * calls
+
+
+def collide(c: Calendar, rng: Random, calls: int) -> Operations:
+    apps = c.list_appointments()
+    return [
+        lambda a1=a1, a2=a2: a1.collide(a2)
+        for a1, a2 in (rng.sample(apps, 2) for _ in range(calls))
+    ]
+
+
+OPERATIONS = {
+    "create_appointment": (create_appointment, CALLS),
+    "is_available": (is_available, CALLS),
+    "accept_appointment": (accept_appointment, 20),
+    "get_appointment": (get_appointment, CALLS),
+    "list_appointments": (list_appointments, CALLS),
+    "collide": (collide, CALLS),
+}
+
+
+def measure(operation: str, size: int) -> float:
+    """Best time of one call on a fresh calendar, in seconds."""
+    prepare, calls = OPERATIONS[operation]
+    c = make_calendar(size)
+    best = float("inf")
+    for op in prepare(c, Random(SEED), calls):
+        start = perf_counter()
+        op()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("operation", list(OPERATIONS))
+def test_operation_scales_within_baseline(operation, size):
+    reference = measure(operation, REFERENCE_SIZE)
+    elapsed = measure(operation, size)
+    key = f"{operation}@{size}"
+    results[key] = elapsed / reference
+
+    if SAVE:
+        return
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    if key not in baseline:
+        pytest.skip(f"no baseline for {key}")
+    expected = reference * baseline[key]
+    limit = max(expected * THRESHOLD, expected + NOISE)
+    assert elapsed <= limit, (
+        f"{key} took {elapsed / reference:.1f} times as long as at"
+        f" {REFERENCE_SIZE}, baseline is {baseline[key]:.1f}"
+    )
+
+
+def teardown_module(module):
+    if SAVE and results:
+        baseline = (
+            json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        )
+        baseline.update(results)
+        BASELINE.write_text(
+            json.dumps(baseline, indent=4, sort_keys=True) + "\n"
+        )
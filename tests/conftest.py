@@ -1,11 +1,19 @@
+import asyncio
+
 from pytest import fixture
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.pool import NullPool
 
 from timetable.adapters.orm import metadata, start_mappers
+from timetable.domain.recurrence import RecurringAppointment
 from timetable.domain.user import Service
-from timetable.service_layer.unit_of_work import SqlUnitOfWork
-from timetable.bootstrap import bootstrap
+from timetable.service_layer.unit_of_work import (
+    AsyncSqlUnitOfWork,
+    SqlUnitOfWork,
+)
+from timetable.bootstrap import bootstrap, bootstrap_async
 
 from tests.fakes import FakeUnitOfWork
 
@@ -19,8 +27,38 @@ def Session():
     yield Session
     clear_mappers()
     del Service.tags
+    del RecurringAppointment.exceptions
 
 
 @fixture
 def fake_mb():
     return bootstrap(False, FakeUnitOfWork())
+
+
+@fixture
+def sqlite_mb(Session):
+    return bootstrap(False, SqlUnitOfWork(Session))
+
+
+@fixture
+def AsyncSessionMaker(Session, tmp_path):
+    # tests drive each coroutine with asyncio.run, so connections must not
+    # be pooled across event loops
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'timetable.db'}", poolclass=NullPool
+    )
+
+    async def create_all():
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    asyncio.run(create_all())
+    yield sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    asyncio.run(engine.dispose())
+
+
+@fixture
+def async_sqlite_mb(AsyncSessionMaker):
+    return bootstrap_async(False, AsyncSqlUnitOfWork(AsyncSessionMaker))
@@ -1,3 +1,4 @@
+from timetable.adapters.read_model import AbstractReadModel
 from timetable.adapters.repository import (
     AbstractRepository,
     TrackingRepository,
@@ -41,18 +42,58 @@ class FakeRepository(AbstractRepository):
 class FakeCalendarRepository(FakeRepository):
     id_attr = "owner"
 
+    def get_window(self, owner, since, until):
+        return self.get(owner)
+
+    def get_for_update(self, owner, since=None, until=None):
+        return self.get(owner)
+
+    def get_appointment_span(self, owner, id):
+        a = self.get(owner).get_appointment(id)
+        return a.since, a.until
+
 
 class FakeTrackingCalendarRepository(TrackingRepository):
     repo_class = FakeCalendarRepository
 
+    def get_window(self, owner, since, until):
+        c = self.repo.get_window(owner, since, until)
+        self.seen.add(c)
+        return c
+
+    def get_for_update(self, owner, since=None, until=None):
+        c = self.repo.get_for_update(owner, since, until)
+        self.seen.add(c)
+        return c
+
+    def get_appointment_span(self, owner, id):
+        return self.repo.get_appointment_span(owner, id)
+
 
 class FakeUsersRepository(FakeRepository):
     id_attr = "account_name"
 
+    def __init__(self, obs, calendars=()):
+        super().__init__(obs)
+        self.calendars = calendars
+
     def list_services(self):
         filtered = [u for u in self.obs if isinstance(u, Service)]
         return filtered
 
+    def search_by_tags(self, tags, since=None, until=None):
+        free = None
+        if since is not None and until is not None:
+            free = {
+                c.owner for c in self.calendars if c.is_available(since, until)
+            }
+        return [
+            (u.account_name, list(u.tags))
+            for u in self.list_services()
+            if all(t in u.tags for t in tags)
+            and (free is None or u.account_name in free)
+        ]
+
 
 class FakeTrackingUserRepository(TrackingRepository):
     repo_class = FakeUsersRepository
@@ -62,12 +103,118 @@ class FakeTrackingUserRepository(TrackingRepository):
         self.seen.update(filtered)
         return filtered
 
+    def search_by_tags(self, tags, since=None, until=None):
+        return self.repo.search_by_tags(tags, since, until)
+
+
+class FakeReadModel(AbstractReadModel):
+    def __init__(self, calendars, users):
+        self.calendars = calendars
+        self.users = users
+
+    def has_calendar(self, owner):
+        return any(c.owner == owner for c in self.calendars.obs)
+
+    def _keyed_rows(self, owner, public):
+        if not self.has_calendar(owner):
+            return []
+        apps = sorted(
+            self.calendars.get(owner).list_appointments(),
+            key=lambda a: (a.since, a.id),
+        )
+        if public:
+            return [
+                ((a.since, a.id), {"since": a.since, "until": a.until})
+                for a in apps
+                if a.accepted
+            ]
+        return [((a.since, a.id), appointment_row(a)) for a in apps]
+
+    def list_appointments(self, owner, public, since=None, until=None):
+        return [
+            row
+            for _, row in self._keyed_rows(owner, public)
+            if since is None or row["since"] < until and row["until"] > since
+        ]
+
+    def list_appointments_page(self, owner, public, limit, after):
+        page = [
+            (key, row)
+            for key, row in self._keyed_rows(owner, public)
+            if after is None or key > after
+        ]
+        return page[:limit]
+
+    def get_appointment(self, owner, id):
+        try:
+            return appointment_row(
+                self.calendars.get(owner).get_appointment(id)
+            )
+        except DoesNotExistsError:
+            return None
+
+    def list_recurring(self, owner, before=None):
+        if not self.has_calendar(owner):
+            return []
+        return [
+            {
+                "id": r.id,
+                "from_user": r.from_user,
+                "since": r.since,
+                "until": r.until,
+                "description": r.description,
+                "every": r.every,
+                "repeat_until": r.repeat_until,
+                "exceptions": set(r.exceptions),
+            }
+            for r in self.calendars.get(owner).list_recurring_appointments()
+            if before is None or r.since < before
+        ]
+
+    def get_user(self, account_name):
+        try:
+            u = self.users.get(account_name)
+        except DoesNotExistsError:
+            return None
+        user = {
+            "account_name": u.account_name,
+            "email": u.email,
+            "password": u.password,
+        }
+        if isinstance(u, Service):
+            user["tags"] = list(u.tags)
+        return user
+
+    def busy_spans(self, owner, since, until):
+        c = self.calendars.get(owner)
+        accepted = sorted(
+            (a.since, a.until)
+            for a in c.list_appointments()
+            if a.accepted and a.since < until and a.until > since
+        )
+        return [accepted] + [
+            r.occurrences(since, until)
+            for r in c.list_recurring_appointments()
+        ]
+
+
+def appointment_row(a):
+    return {
+        "id": a.id,
+        "from_user": a.from_user,
+        "since": a.since,
+        "until": a.until,
+        "description": a.description,
+        "accepted": a.accepted,
+    }
+
 
 class FakeUnitOfWork(AbstractUnitOfWork):
     def __init__(self):
         self.commited = False
         self.calendars = FakeTrackingCalendarRepository([])
-        self.users = FakeTrackingUserRepository([])
+        self.users = FakeTrackingUserRepository([], self.calendars.repo.obs)
+        self.read_model = FakeReadModel(self.calendars.repo, self.users.repo)
         self.events = []
 
     def __enter__(self):
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from timetable.domain.command import (
+    AcceptAppointment,
+    CreateAppointment,
+    CreateClient,
+    CreateService,
+)
+from timetable.domain.exceptions import (
+    ConcurrencyError,
+    DoesNotExistsError,
+    NotAvailableError,
+)
+
+
+def appointment(to_user, from_user, hour):
+    return CreateAppointment(
+        to_user,
+        from_user,
+        datetime(2000, 1, 1, hour),
+        datetime(2000, 1, 1, hour + 1),
+        "mechanic needed",
+    )
+
+
+def test_async_bus_handles_commands(async_sqlite_mb):
+    mb = async_sqlite_mb
+
+    async def scenario():
+        await mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+        await mb.handle(CreateClient("john", "john@dot.com", "123"))
+        await mb.handle(appointment("bob", "john", 1))
+        await mb.handle(appointment("bob", "sam", 1))
+        await mb.handle(AcceptAppointment("bob", 0))
+        with pytest.raises(NotAvailableError):
+            await mb.handle(appointment("bob", "katie", 1))
+        with pytest.raises(DoesNotExistsError):
+            await mb.handle(appointment("katie", "john", 1))
+        async with mb.uow:
+            c = await mb.uow.calendars.get("bob")
+            service = await mb.uow.users.get("bob")
+        return c, service
+
+    c, service = asyncio.run(scenario())
+
+    assert [(a.id, a.accepted) for a in c.list_appointments()] == [(0, True)]
+    assert c.version == 4
+    assert service.tags == ["car"]
+
+
+def test_async_uow_keeps_a_session_per_task(async_sqlite_mb):
+    mb = async_sqlite_mb
+
+    async def read(owner):
+        async with mb.uow:
+            await asyncio.sleep(0)
+            c = await mb.uow.calendars.get(owner)
+            await asyncio.sleep(0)
+            return c, mb.uow.session
+
+    async def scenario():
+        for owner in ("bob", "katie"):
+            await mb.handle(
+                CreateService(owner, f"{owner}@dot.com", "123", ["car"])
+            )
+            await mb.handle(appointment(owner, "john", 1))
+        return await asyncio.gather(read("bob"), read("katie"))
+
+    [(bob, bob_session), (katie, katie_session)] = asyncio.run(scenario())
+
+    assert bob_session is not katie_session
+    assert (bob.owner, katie.owner) == ("bob", "katie")
+    assert [a.from_user for a in katie.list_appointments()] == ["john"]
+
+
+def test_async_bus_retries_coroutine_handlers(async_sqlite_mb):
+    mb = async_sqlite_mb
+    calls = []
+
+    async def handle_command(c):
+        async with mb.uow:
+            calls.append(c)
+            if len(calls) <= 2:
+                raise ConcurrencyError
+
+    mb.command_handlers = {CreateClient: handle_command}
+    mb.backoff = 0
+    command = CreateClient("john", "john@dot.com", "123")
+
+    asyncio.run(mb.handle(command))
+
+    assert calls == [command] * 3
+    assert mb.retries == 2
@@ -0,0 +1,251 @@
+import io
+import json
+from datetime import datetime
+
+from pytest import fixture
+from sqlalchemy import create_engine
+
+from timetable.adapters.orm import metadata
+from timetable.import_data import BulkImporter, read_csv, read_jsonl
+
+
+@fixture
+def engine():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    return engine
+
+
+def jsonl(*records):
+    return io.StringIO("\n".join(json.dumps(r) for r in records))
+
+
+def service(name, tags=()):
+    return {
+        "kind": "service",
+        "account_name": name,
+        "email": f"{name}@dot.com",
+        "password": "123",
+        "tags": list(tags),
+    }
+
+
+def appointment(to_user, since, until, accepted=False):
+    return {
+        "kind": "appointment",
+        "to_user": to_user,
+        "from_user": "john",
+        "since": since,
+        "until": until,
+        "description": "mechanic needed",
+        "accepted": accepted,
+    }
+
+
+def test_import_users_and_appointments(engine):
+    records = jsonl(
+        service("bob", ["warsaw", "mechanic"]),
+        {
+            "kind": "client",
+            "account_name": "john",
+            "email": "john@dot.com",
+            "password": "123",
+        },
+        appointment("bob", "2000-01-01 01:00", "2000-01-01 02:00", True),
+        appointment("bob", "2000-01-01 01:30", "2000-01-01 02:30"),
+        appointment("bob", "2000-01-01 03:00", "2000-01-01 04:00"),
+        appointment("katie", "2000-01-01 03:00", "2000-01-01 04:00"),
+        {"kind": "nonsense"},
+    )
+
+    importer = BulkImporter(engine).run(read_jsonl(records))
+
+    assert (importer.read, importer.rejected) == (7, 3)
+    assert list(engine.execute("SELECT account_name, type FROM users")) == [
+        ("bob", "service"),
+        ("john", "client"),
+    ]
+    assert list(engine.execute("SELECT tag FROM tags ORDER BY id")) == [
+        ("warsaw",),
+        ("mechanic",),
+    ]
+    rows = engine.execute(
+        "SELECT id, since, accepted FROM appointments ORDER BY id"
+    )
+    assert [(id, since[11:16], accepted) for id, since, accepted in rows] == [
+        (0, "01:00", True),
+        (1, "03:00", False),
+    ]
+    assert list(engine.execute("SELECT id_count, version FROM calendars")) == [
+        (2, 2)
+    ]
+
+
+def test_import_in_batches_with_evicted_calendars(engine):
+    BulkImporter(engine).run(
+        [
+            service("bob"),
+            appointment("bob", "2000-01-01 01:00", "2000-01-01 02:00", True),
+        ]
+    )
+    records = [service("bob"), service("katie")]
+    for hour in range(1, 6):
+        for owner in ("bob", "katie"):
+            records.append(
+                appointment(
+                    owner,
+                    f"2000-01-01 {hour:02}:00",
+                    f"2000-01-01 {hour:02}:30",
+                    accepted=True,
+                )
+            )
+
+    importer = BulkImporter(engine, batch_size=3, cache_size=1).run(records)
+
+    # bob exists already and is busy at 1:00
+    assert importer.rejected == 2
+    assert list(
+        engine.execute(
+            "SELECT calendar_owner, count(*), max(id) FROM appointments"
+            " GROUP BY calendar_owner ORDER BY calendar_owner"
+        )
+    ) == [("bob", 5, 4), ("katie", 5, 4)]
+    assert list(
+        engine.execute("SELECT owner, id_count FROM calendars ORDER BY owner")
+    ) == [("bob", 5), ("katie", 5)]
+
+
+def test_import_services_and_their_appointments_in_one_batch(
+    engine, monkeypatch
+):
+    flushes = []
+    flush = BulkImporter.flush
+    monkeypatch.setattr(
+        BulkImporter, "flush", lambda self: flushes.append(flush(self))
+    )
+    records = []
+    for i in range(50):
+        records.append(service(f"service{i}"))
+        for hour in range(1, 4):
+            records.append(
+                appointment(
+                    f"service{i}",
+                    f"2000-01-01 {hour:02}:00",
+                    f"2000-01-01 {hour:02}:30",
+                )
+            )
+
+    importer = BulkImporter(engine).run(records)
+
+    assert len(flushes) == 1
+    assert importer.rejected == 0
+    assert list(
+        engine.execute("SELECT count(*), max(id_count) FROM calendars")
+    ) == [(50, 3)]
+
+
+def test_import_existing_service_checks_stored_calendar(engine):
+    BulkImporter(engine).run(
+        [
+            service("bob"),
+            appointment("bob", "2000-01-01 01:00", "2000-01-01 02:00", True),
+            appointment("bob", "2000-01-01 03:00", "2000-01-01 04:00"),
+        ]
+    )
+
+    importer = BulkImporter(engine).run(
+        [
+            service("bob"),
+            appointment("bob", "2000-01-01 01:30", "2000-01-01 02:30"),
+            appointment("bob", "2000-01-01 03:00", "2000-01-01 05:00", True),
+        ]
+    )
+
+    # the repeated service and the appointment colliding with 1:00
+    assert importer.rejected == 2
+    assert importer.dropped == 1
+    assert list(
+        engine.execute(
+            "SELECT id, since, accepted FROM appointments ORDER BY id"
+        )
+    ) == [
+        (0, "2000-01-01 01:00:00.000000", True),
+        (2, "2000-01-01 03:00:00.000000", True),
+    ]
+    assert list(engine.execute("SELECT id_count FROM calendars")) == [(3,)]
+
+
+def test_import_accepted_drops_overlapping_requests(engine):
+    BulkImporter(engine).run(
+        [
+            service("bob"),
+            appointment("bob", "2000-01-01 01:00", "2000-01-01 02:00"),
+            appointment("bob", "2000-01-01 05:00", "2000-01-01 06:00"),
+        ]
+    )
+
+    importer = BulkImporter(engine).run(
+        [
+            appointment("bob", "2000-01-01 02:00", "2000-01-01 03:00"),
+            appointment("bob", "2000-01-01 03:00", "2000-01-01 04:00"),
+            appointment("bob", "2000-01-01 01:30", "2000-01-01 02:30", True),
+        ]
+    )
+
+    assert (importer.rejected, importer.dropped) == (0, 2)
+    rows = engine.execute(
+        "SELECT id, since, accepted FROM appointments ORDER BY id"
+    )
+    assert [(id, since[11:16], accepted) for id, since, accepted in rows] == [
+        (1, "05:00", False),
+        (3, "03:00", False),
+        (4, "01:30", True),
+    ]
+    assert list(engine.execute("SELECT id_count FROM calendars")) == [(5,)]
+
+
+def test_import_checks_recurring_appointments(engine):
+    BulkImporter(engine).run([service("bob")])
+    engine.execute(
+        "INSERT INTO recurring_appointments VALUES"
+        " ('bob', 0, 'john', ?, ?, 'weekly', ?, NULL)",
+        datetime(2000, 1, 1, 10),
+        datetime(2000, 1, 1, 9),
+        datetime(1970, 1, 8),
+    )
+    engine.execute("UPDATE calendars SET id_count = 1")
+
+    importer = BulkImporter(engine).run(
+        [
+            appointment("bob", "2000-01-08 09:30", "2000-01-08 10:30"),
+            appointment("bob", "2000-01-09 09:30", "2000-01-09 10:30"),
+        ]
+    )
+
+    assert importer.rejected == 1
+    assert list(engine.execute("SELECT id FROM appointments")) == [(1,)]
+
+
+def test_read_csv():
+    f = io.StringIO(
+        "kind,account_name,email,password,tags,to_user,since,until,accepted\n"
+        "service,bob,bob@dot.com,123,warsaw;mechanic,,,,\n"
+        "appointment,,,,,bob,2000-01-01 01:00,2000-01-01 02:00,true\n"
+    )
+
+    assert list(read_csv(f)) == [
+        {
+            "kind": "service",
+            "account_name": "bob",
+            "email": "bob@dot.com",
+            "password": "123",
+            "tags": ["warsaw", "mechanic"],
+        },
+        {
+            "kind": "appointment",
+            "to_user": "bob",
+            "since": "2000-01-01 01:00",
+            "until": "2000-01-01 02:00",
+            "accepted": "true",
+        },
+    ]
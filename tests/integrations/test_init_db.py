@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine, inspect
+
+from timetable.adapters.orm import metadata
+from timetable.init_db import upgrade_schema
+
+
+def index_names(engine, table):
+    return {ix["name"] for ix in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_schema_creates_missing_indexes():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    engine.execute("DROP INDEX ix_appointments_calendar_accepted_span")
+    engine.execute("DROP INDEX ix_tags_tag_service")
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    assert index_names(engine, "appointments") == {
+        "ix_appointments_calendar_accepted_span",
+        "ix_appointments_from_user",
+        "ix_appointments_calendar_since_id",
+    }
+    assert index_names(engine, "tags") == {"ix_tags_tag_service"}
+
+
+def test_upgrade_schema_adds_missing_columns():
+    engine = create_engine("sqlite://")
+    engine.execute(
+        "CREATE TABLE calendars (owner VARCHAR PRIMARY KEY, id_count INTEGER)"
+    )
+    engine.execute("INSERT INTO calendars VALUES ('bob', 0)")
+    metadata.create_all(engine)
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    [[version]] = engine.execute("SELECT version FROM calendars")
+    assert version == 1
+
+
+def test_upgrade_schema_adds_exclusion_constraint_only_to_postgresql(
+    monkeypatch,
+):
+    monkeypatch.setenv("PG_EXCLUSION_CONSTRAINT", "1")
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    # would fail on the pg_constraint catalog if tried
+    upgrade_schema(engine)
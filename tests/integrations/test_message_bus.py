@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from timetable.domain.command import (
+    AcceptAppointment,
+    CreateAppointment,
+    CreateService,
+)
+from timetable.domain.exceptions import DoesNotExistsError, NotAvailableError
+
+
+def appointment(to_user, from_user, hour):
+    return CreateAppointment(
+        to_user,
+        from_user,
+        datetime(2000, 1, 1, hour),
+        datetime(2000, 1, 1, hour + 1),
+        "mechanic needed",
+    )
+
+
+def test_handle_many_commits_batch_once(Session, sqlite_mb):
+    sqlite_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+    commits = []
+    event.listen(
+        sqlite_mb.uow.session_factory.kw["bind"],
+        "commit",
+        lambda conn: commits.append(conn),
+    )
+
+    errors = sqlite_mb.handle_many(
+        [
+            appointment("bob", "john", 1),
+            appointment("katie", "john", 2),
+            appointment("bob", "sam", 3),
+            CreateService("bob", "bob@dot.com", "123", ["car"]),
+        ]
+    )
+
+    assert [type(e) for e in errors] == [
+        type(None),
+        DoesNotExistsError,
+        type(None),
+        NotAvailableError,
+    ]
+    assert len(commits) == 1
+    session = Session()
+    rows = session.execute("SELECT id, from_user FROM appointments")
+    assert sorted(rows) == [(0, "john"), (1, "sam")]
+
+
+def test_handle_many_reloads_window_of_each_message(Session, sqlite_mb):
+    sqlite_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+    sqlite_mb.handle(appointment("bob", "john", 5))
+    sqlite_mb.handle(AcceptAppointment("bob", 0))
+
+    errors = sqlite_mb.handle_many(
+        [
+            appointment("bob", "sam", 1),
+            CreateAppointment(
+                "bob",
+                "eve",
+                datetime(2000, 1, 1, 5, 30),
+                datetime(2000, 1, 1, 6, 30),
+                "mechanic needed",
+            ),
+        ]
+    )
+
+    assert [type(e) for e in errors] == [type(None), NotAvailableError]
+    session = Session()
+    rows = session.execute("SELECT from_user FROM appointments")
+    assert sorted(rows) == [("john",), ("sam",)]
+
+
+def test_handle_many_accepts_appointment_out_of_loaded_window(
+    Session, sqlite_mb
+):
+    sqlite_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+    sqlite_mb.handle(appointment("bob", "john", 5))
+
+    errors = sqlite_mb.handle_many(
+        [appointment("bob", "sam", 1), AcceptAppointment("bob", 0)]
+    )
+
+    assert errors == [None, None]
+    session = Session()
+    rows = session.execute("SELECT from_user, accepted FROM appointments")
+    assert sorted(rows) == [("john", True), ("sam", False)]
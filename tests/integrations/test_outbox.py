@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pytest import raises
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+
+from timetable.adapters.orm import outbox
+from timetable.adapters.outbox import (
+    deserialize,
+    event_type,
+    event_types,
+    serialize,
+)
+from timetable.domain.event import Event
+from timetable.service_layer.dispatcher import OutboxDispatcher
+from timetable.service_layer.unit_of_work import SqlUnitOfWork
+from timetable.bootstrap import bootstrap
+
+from tests.utils import insert_calendar
+
+
+@dataclass
+class AppointmentBooked(Event):
+    owner: str
+    since: datetime
+    every: Optional[timedelta]
+    guests: List[str]
+
+
+def booked(owner, hour):
+    return AppointmentBooked(
+        owner, datetime(2000, 1, 1, hour), timedelta(days=7), ["john"]
+    )
+
+
+def test_serialize_round_trip():
+    e = booked("bob", 1)
+
+    payload = serialize(e)
+
+    assert payload == {
+        "owner": "bob",
+        "since": "2000-01-01T01:00:00",
+        "every": 604800.0,
+        "guests": ["john"],
+    }
+    types = event_types([AppointmentBooked])
+    assert deserialize(event_type(e), payload, types) == e
+    with raises(ValueError):
+        deserialize("os.system", payload, types)
+
+
+def raise_events(Session, *events):
+    uow = SqlUnitOfWork(Session)
+    with uow:
+        for e in events:
+            uow.calendars.get(e.owner).events.append(e)
+        uow.commit()
+
+
+def test_dispatcher_publishes_committed_events(Session):
+    s = Session()
+    insert_calendar(s, "bob")
+    insert_calendar(s, "katie")
+    handled = []
+    mb = bootstrap(False, SqlUnitOfWork(Session))
+    mb.events_handlers = {AppointmentBooked: [handled.append]}
+    statements = []
+    event.listen(
+        s.get_bind(),
+        "before_execute",
+        lambda conn, clause, *args: statements.append(
+            str(clause.compile(dialect=postgresql.dialect()))
+        ),
+    )
+
+    raise_events(Session, booked("bob", 1), booked("katie", 2))
+    raise_events(Session, booked("bob", 3))
+    dispatcher = OutboxDispatcher(mb, Session, batch_size=2)
+
+    assert handled == []
+    assert dispatcher.dispatch() == 2
+    assert dispatcher.dispatch() == 1
+    assert dispatcher.dispatch() == 0
+    # calendars of one commit come in no particular order
+    assert sorted(handled, key=lambda e: e.since) == [
+        booked("bob", 1),
+        booked("katie", 2),
+        booked("bob", 3),
+    ]
+    claims = [st for st in statements if st.startswith("SELECT outbox.id")]
+    assert claims[0].endswith("FOR UPDATE SKIP LOCKED")
+    assert list(
+        s.execute("SELECT count(*) FROM outbox WHERE processed_at IS NULL")
+    ) == [(0,)]
+
+
+def test_dispatcher_retries_failed_events(Session):
+    s = Session()
+    insert_calendar(s, "bob")
+    calls = []
+
+    def flaky(e):
+        calls.append(e)
+        if e.since.hour == 1:
+            raise ValueError("mail server down")
+
+    mb = bootstrap(False, SqlUnitOfWork(Session))
+    mb.events_handlers = {AppointmentBooked: [flaky]}
+    raise_events(Session, booked("bob", 1), booked("bob", 2))
+    dispatcher = OutboxDispatcher(mb, Session, max_attempts=2)
+
+    assert dispatcher.dispatch() == 2
+    assert dispatcher.dispatch() == 1
+    assert dispatcher.dispatch() == 0
+    assert [e.since.hour for e in calls] == [1, 2, 1]
+    assert list(
+        s.execute("SELECT attempts, processed_at IS NULL FROM outbox")
+    ) == [(2, 1), (1, 0)]
+
+
+class Fatal(BaseException):
+    pass
+
+
+def test_dispatcher_records_attempts_of_any_error(Session):
+    s = Session()
+    insert_calendar(s, "bob")
+    calls = []
+
+    def fatal(e):
+        calls.append(e)
+        raise Fatal
+
+    mb = bootstrap(False, SqlUnitOfWork(Session))
+    mb.events_handlers = {AppointmentBooked: [fatal, calls.append]}
+    raise_events(Session, booked("bob", 1))
+    dispatcher = OutboxDispatcher(mb, Session, max_attempts=1)
+
+    assert dispatcher.dispatch() == 1
+    assert dispatcher.dispatch() == 0
+    assert calls == [booked("bob", 1)] * 2
+    assert list(
+        s.execute("SELECT attempts, processed_at IS NULL FROM outbox")
+    ) == [(1, 1)]
+
+
+def test_dispatcher_skips_unknown_event_types(Session):
+    s = Session()
+    s.execute(outbox.insert(), [{"type": "os.system", "payload": {}}])
+    s.commit()
+    mb = bootstrap(False, SqlUnitOfWork(Session))
+    mb.events_handlers = {AppointmentBooked: []}
+    dispatcher = OutboxDispatcher(mb, Session, max_attempts=2)
+
+    assert dispatcher.dispatch() == 1
+    assert list(
+        s.execute("SELECT attempts, processed_at IS NULL FROM outbox")
+    ) == [(1, 1)]
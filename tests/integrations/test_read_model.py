@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+from timetable.adapters.read_model import SqlReadModel
+from timetable.adapters.repository import SqlTrackingCalendarRepository
+from timetable.domain.calendar import Calendar
+
+from tests.utils import (
+    insert_appointment,
+    insert_calendar,
+    insert_client,
+    insert_service,
+)
+
+
+def test_read_model_lists_appointments_page(Session):
+    session = Session()
+    c = Calendar(owner="bob")
+    a5, a1, a3, a7, a1_bis = [
+        c.create_appointment(
+            from_user,
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 1),
+            "mechanic needed",
+        )
+        for from_user, hour in (
+            ("john", 5),
+            ("john", 1),
+            ("john", 3),
+            ("john", 7),
+            ("katie", 1),
+        )
+    ]
+    c.accept_appointment(a3)
+    c.accept_appointment(a5)
+    SqlTrackingCalendarRepository(session).add(c)
+    session.commit()
+    read_model = SqlReadModel(session)
+
+    first = read_model.list_appointments_page("bob", False, 2, None)
+    second = read_model.list_appointments_page("bob", False, 2, first[-1][0])
+    accepted = read_model.list_appointments_page(
+        "bob", True, 5, (a3.since, a3.id)
+    )
+
+    assert [key for key, _ in first] == [
+        (a1.since, a1.id),
+        (a1_bis.since, a1_bis.id),
+    ]
+    assert first[1][1] == {
+        "id": a1_bis.id,
+        "from_user": "katie",
+        "since": a1_bis.since,
+        "until": a1_bis.until,
+        "description": "mechanic needed",
+        "accepted": False,
+    }
+    assert [row["since"].hour for _, row in second] == [3, 5]
+    assert accepted == [
+        ((a5.since, a5.id), {"since": a5.since, "until": a5.until})
+    ]
+    assert (
+        read_model.list_appointments_page("bob", False, 2, (a7.since, 9)) == []
+    )
+
+
+def test_read_model_has_calendar(Session):
+    session = Session()
+    SqlTrackingCalendarRepository(session).add(Calendar(owner="bob"))
+    session.commit()
+    read_model = SqlReadModel(session)
+
+    assert read_model.has_calendar("bob")
+    assert not read_model.has_calendar("katie")
+
+
+def test_read_model_lists_appointments(Session):
+    session = Session()
+    insert_calendar(session, "bob")
+    for hour, accepted in ((5, True), (1, False)):
+        insert_appointment(
+            session,
+            "bob",
+            "john",
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 1),
+            "mechanic needed",
+            accepted,
+        )
+    read_model = SqlReadModel(session)
+
+    owned = read_model.list_appointments("bob", False)
+    public = read_model.list_appointments("bob", True)
+
+    assert [(a["id"], a["accepted"]) for a in owned] == [(2, False), (1, True)]
+    assert public == [
+        {"since": datetime(2000, 1, 1, 5), "until": datetime(2000, 1, 1, 6)}
+    ]
+    assert read_model.get_appointment("bob", 2) == owned[0]
+    assert read_model.get_appointment("bob", 3) is None
+
+
+def test_read_model_gets_user(Session):
+    session = Session()
+    insert_service(session, "bob", "bob@dot.com", "123", ["car", "warsaw"])
+    insert_client(session, "john", "john@dot.com", "456")
+    read_model = SqlReadModel(session)
+
+    assert read_model.get_user("bob") == {
+        "account_name": "bob",
+        "email": "bob@dot.com",
+        "password": "123",
+        "tags": ["car", "warsaw"],
+    }
+    assert read_model.get_user("john") == {
+        "account_name": "john",
+        "email": "john@dot.com",
+        "password": "456",
+    }
+    assert read_model.get_user("katie") is None
+
+
+def test_read_model_lists_busy_spans(Session):
+    session = Session()
+    c = Calendar(owner="bob")
+    for hour in (1, 5, 20):
+        a = c.create_appointment(
+            "john",
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 1),
+            "mechanic needed",
+        )
+        c.accept_appointment(a)
+    c.create_appointment(
+        "john", datetime(2000, 1, 1, 8), datetime(2000, 1, 1, 9), "pending"
+    )
+    r = c.add_recurring_appointment(
+        "katie",
+        datetime(1999, 12, 31, 3),
+        datetime(1999, 12, 31, 4),
+        "weekly wash",
+        timedelta(hours=4),
+    )
+    c.cancel_occurrence(r.id, datetime(2000, 1, 1, 7))
+    SqlTrackingCalendarRepository(session).add(c)
+    session.commit()
+    read_model = SqlReadModel(session)
+
+    spans = read_model.busy_spans(
+        "bob", datetime(2000, 1, 1), datetime(2000, 1, 1, 12)
+    )
+
+    hours = [[(s.hour, u.hour) for s, u in run] for run in spans]
+    assert hours == [[(1, 2), (5, 6)], [(3, 4), (11, 12)]]
+
+
+def test_read_model_lists_recurring_and_windowed_appointments(Session):
+    session = Session()
+    c = Calendar(owner="bob")
+    for hour in (1, 5):
+        a = c.create_appointment(
+            "john",
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 1),
+            "mechanic needed",
+        )
+        c.accept_appointment(a)
+    weekly = c.add_recurring_appointment(
+        "katie",
+        datetime(2000, 1, 1, 3),
+        datetime(2000, 1, 1, 4),
+        "weekly wash",
+        timedelta(weeks=1),
+        datetime(2000, 2, 1),
+    )
+    c.cancel_occurrence(weekly.id, datetime(2000, 1, 8, 3))
+    c.add_recurring_appointment(
+        "katie",
+        datetime(2000, 3, 1, 3),
+        datetime(2000, 3, 1, 4),
+        "monthly check",
+        timedelta(weeks=4),
+    )
+    SqlTrackingCalendarRepository(session).add(c)
+    session.commit()
+    read_model = SqlReadModel(session)
+
+    windowed = read_model.list_appointments(
+        "bob", True, datetime(2000, 1, 1, 4), datetime(2000, 1, 1, 12)
+    )
+    [rule] = read_model.list_recurring("bob", datetime(2000, 2, 1))
+
+    assert windowed == [
+        {"since": datetime(2000, 1, 1, 5), "until": datetime(2000, 1, 1, 6)}
+    ]
+    assert rule == {
+        "id": weekly.id,
+        "from_user": "katie",
+        "since": datetime(2000, 1, 1, 3),
+        "until": datetime(2000, 1, 1, 4),
+        "description": "weekly wash",
+        "every": timedelta(weeks=1),
+        "repeat_until": datetime(2000, 2, 1),
+        "exceptions": {datetime(2000, 1, 8, 3)},
+    }
+    assert len(read_model.list_recurring("bob")) == 2
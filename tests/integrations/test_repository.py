@@ -1,12 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
 
-from timetable.adapters.repository import SqlTrackingCalendarRepository
+from timetable.adapters.repository import (
+    SqlTrackingCalendarRepository,
+    SqlUserRepository,
+)
 from timetable.domain.calendar import Calendar
-from timetable.domain.exceptions import DoesNotExistsError
+from timetable.domain.exceptions import DoesNotExistsError, NotAvailableError
 
-from tests.utils import insert_appointment, insert_calendar
+from tests.utils import insert_appointment, insert_calendar, insert_service
 
 
 def test_repository_can_add(Session):
@@ -171,3 +176,137 @@ def test_repository_can_list(Session):
     assert a21.until == until21
     assert a21.description == description21
     assert not a21.accepted
+
+
+def test_repository_loaded_calendar_checks_collisions(Session):
+    session = Session()
+    owner = "bob"
+    insert_calendar(session, owner)
+    insert_appointment(
+        session,
+        owner,
+        "john",
+        datetime(2000, 1, 1, 1),
+        datetime(2000, 1, 1, 3),
+        "mechanic needed",
+        True,
+    )
+
+    repository = SqlTrackingCalendarRepository(session)
+    c = repository.get(owner)
+
+    with pytest.raises(NotAvailableError):
+        c.create_appointment(
+            "katie",
+            datetime(2000, 1, 1, 2),
+            datetime(2000, 1, 1, 4),
+            "car repair",
+        )
+    a = c.create_appointment(
+        "katie",
+        datetime(2000, 1, 1, 3),
+        datetime(2000, 1, 1, 4),
+        "car repair",
+    )
+    assert c.list_appointments()[-1] == a
+
+
+def test_repository_stores_recurring_appointments(Session):
+    session = Session()
+    owner = "bob"
+    insert_calendar(session, owner)
+    insert_calendar(session, "katie")
+    first = datetime(2000, 1, 3, 12)
+    week = timedelta(weeks=1)
+
+    repository = SqlTrackingCalendarRepository(session)
+    c = repository.get(owner)
+    r = c.add_recurring_appointment(
+        "john", first, first + timedelta(hours=1), "weekly checkup", week
+    )
+    c.cancel_occurrence(r.id, first + week)
+    session.commit()
+
+    session = Session()
+    repository = SqlTrackingCalendarRepository(session)
+    [r] = repository.get(owner).list_recurring_appointments()
+    assert r.every == week
+    assert list(r.exceptions) == [first + week]
+
+    insert_service(session, "bob", "bob@dot.com", "123", [])
+    insert_service(session, "katie", "katie@dot.com", "123", [])
+    users = SqlUserRepository(session)
+    free = users.search_by_tags([], first + week, first + 2 * week)
+    assert sorted(free) == [("bob", []), ("katie", [])]
+    free = users.search_by_tags([], first + 2 * week, first + 3 * week)
+    assert free == [("katie", [])]
+
+
+def test_repository_get_window_loads_only_overlapping(Session):
+    session = Session()
+    owner = "bob"
+    insert_calendar(session, owner)
+    for hour, accepted in ((1, True), (3, False), (4, True), (8, False)):
+        insert_appointment(
+            session,
+            owner,
+            "john",
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 2),
+            "mechanic needed",
+            accepted,
+        )
+
+    repository = SqlTrackingCalendarRepository(session)
+    c = repository.get_window(
+        owner, datetime(2000, 1, 1, 4), datetime(2000, 1, 1, 5)
+    )
+
+    assert sorted(a.since.hour for a in c.list_appointments()) == [3, 4]
+    assert repository.seen == {c}
+    assert repository.get_appointment_span(owner, 4) == (
+        datetime(2000, 1, 1, 8),
+        datetime(2000, 1, 1, 10),
+    )
+    with pytest.raises(DoesNotExistsError):
+        repository.get_window(
+            "katie", datetime(2000, 1, 1, 4), datetime(2000, 1, 1, 5)
+        )
+    with pytest.raises(DoesNotExistsError):
+        repository.get_appointment_span(owner, 5)
+
+
+def test_repository_get_for_update_locks_calendar_first(Session):
+    session = Session()
+    owner = "bob"
+    insert_calendar(session, owner)
+    for hour in (1, 4):
+        insert_appointment(
+            session,
+            owner,
+            "john",
+            datetime(2000, 1, 1, hour),
+            datetime(2000, 1, 1, hour + 2),
+            "mechanic needed",
+            True,
+        )
+    statements = []
+    event.listen(
+        session.get_bind(),
+        "before_execute",
+        lambda conn, clause, *args: statements.append(
+            str(clause.compile(dialect=postgresql.dialect()))
+        ),
+    )
+
+    repository = SqlTrackingCalendarRepository(session)
+    c = repository.get_for_update(
+        owner, datetime(2000, 1, 1, 4), datetime(2000, 1, 1, 5)
+    )
+
+    assert [a.since.hour for a in c.list_appointments()] == [4]
+    assert repository.seen == {c}
+    assert statements[0].endswith("FOR UPDATE")
+    assert all("FOR UPDATE" not in s for s in statements[1:])
+    with pytest.raises(DoesNotExistsError):
+        repository.get_for_update("katie")
@@ -1,7 +1,19 @@
+import asyncio
+import threading
 from datetime import datetime
 
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from timetable.adapters.orm import metadata
 from timetable.domain.calendar import Calendar
-from timetable.service_layer.unit_of_work import SqlUnitOfWork
+from timetable.domain.exceptions import ConcurrencyError, NotAvailableError
+from timetable.service_layer.unit_of_work import (
+    EXCLUSION_VIOLATION,
+    SqlUnitOfWork,
+)
 
 
 from tests.utils import insert_appointment, insert_calendar
@@ -11,6 +23,23 @@ class FakeEvent:
     """FakeEvent"""
 
 
+class FakeDriverError(Exception):
+    def __init__(self, pgcode):
+        self.pgcode = pgcode
+
+
+class FailingSession:
+    def __init__(self, pgcode):
+        self.pgcode = pgcode
+        self.rolled_back = False
+
+    def commit(self):
+        raise IntegrityError("INSERT", {}, FakeDriverError(self.pgcode))
+
+    def rollback(self):
+        self.rolled_back = True
+
+
 class TestUnitOfWork:
     def test_uow_can_create_calendar(self, Session):
         uow = SqlUnitOfWork(Session)
@@ -116,7 +145,318 @@ class TestUnitOfWork:
             c = uow.calendars.get(owner)
             c.events.append(ev1)
             c.events.append(ev2)
-            uow.commit()
             events_collected = set(uow.collect_new_events())
 
         assert events_collected == {ev1, ev2}
+
+    def test_uow_commit_moves_events_to_outbox(self, Session):
+        s = Session()
+        insert_calendar(s, "bob")
+        insert_calendar(s, "katie")
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            uow.calendars.get("bob").events.append(FakeEvent())
+            uow.commit()
+            with uow:
+                # rolled back with the savepoint
+                uow.calendars.get("katie").events.append(FakeEvent())
+            uow.commit()
+            events_collected = list(uow.collect_new_events())
+
+        assert events_collected == []
+        rows = list(s.execute("SELECT type, processed_at FROM outbox"))
+        assert rows == [("test_unit_of_work.FakeEvent", None)]
+
+    def test_uow_accept_deletes_only_colliding_appointments(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        for hour in (1, 2, 5):
+            insert_appointment(
+                s,
+                owner,
+                "john",
+                datetime(2000, 1, 1, hour),
+                datetime(2000, 1, 1, hour + 2),
+                "rapair my car",
+                False,
+            )
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            c = uow.calendars.get(owner)
+            [a, _, a_far] = c.list_appointments()
+            c.accept_appointment(a)
+            expected = [(a.id, True), (a_far.id, False)]
+            uow.commit()
+
+        rows = list(s.execute("SELECT id, accepted FROM appointments"))
+        assert sorted(rows) == expected
+
+    def test_uow_windowed_accept_keeps_other_appointments(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        for hour in (1, 2, 5, 9):
+            insert_appointment(
+                s,
+                owner,
+                "john",
+                datetime(2000, 1, 1, hour),
+                datetime(2000, 1, 1, hour + 2),
+                "rapair my car",
+                False,
+            )
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            since, until = uow.calendars.get_appointment_span(owner, 1)
+            c = uow.calendars.get_window(owner, since, until)
+            c.accept_appointment(c.get_appointment(1))
+            c.create_appointment(
+                "katie",
+                datetime(2000, 1, 1, 3),
+                datetime(2000, 1, 1, 4),
+                "car wash",
+            )
+            uow.commit()
+
+        rows = list(s.execute("SELECT id, accepted FROM appointments"))
+        assert sorted(rows) == [(0, False), (1, True), (3, False), (4, False)]
+
+    def test_uow_maps_exclusion_violation_to_not_available(self):
+        session = FailingSession(EXCLUSION_VIOLATION)
+        uow = SqlUnitOfWork(lambda: session)
+        with pytest.raises(NotAvailableError):
+            with uow:
+                uow.commit()
+        assert session.rolled_back
+
+    def test_uow_maps_exclusion_violation_of_autoflush(self, Session):
+        uow = SqlUnitOfWork(Session)
+        with pytest.raises(NotAvailableError):
+            with uow:
+                # as raised by a query flushing an overlapping appointment
+                raise IntegrityError(
+                    "INSERT", {}, FakeDriverError(EXCLUSION_VIOLATION)
+                )
+
+    def test_uow_keeps_other_integrity_errors(self):
+        uow = SqlUnitOfWork(lambda: FailingSession("23505"))
+        with pytest.raises(IntegrityError):
+            with uow:
+                uow.commit()
+
+    def test_uow_bumps_version_of_seen_calendars(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        insert_appointment(
+            s,
+            owner,
+            "john",
+            datetime(2000, 1, 1, 1),
+            datetime(2000, 1, 1, 2),
+            "rapair my car",
+            False,
+        )
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            c = uow.calendars.get(owner)
+            c.accept_appointment(c.get_appointment(1))
+            uow.commit()
+
+        [[version]] = s.execute("SELECT version FROM calendars")
+        assert version == 2
+
+    def test_uow_detects_concurrent_modification(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        since = datetime(2000, 1, 1, 1)
+        until = datetime(2000, 1, 1, 2)
+
+        first = SqlUnitOfWork(Session)
+        second = SqlUnitOfWork(Session)
+        with first, second:
+            c1 = first.calendars.get(owner)
+            c2 = second.calendars.get(owner)
+            c1.create_appointment("john", since, until, "rapair my car")
+            c2.create_appointment("katie", since, until, "car wash")
+            first.commit()
+            with pytest.raises(ConcurrencyError):
+                second.commit()
+
+        rows = list(s.execute("SELECT from_user FROM appointments"))
+        assert rows == [("john",)]
+
+    def test_uow_detects_concurrent_modification_on_autoflush(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        since = datetime(2000, 1, 1, 1)
+        until = datetime(2000, 1, 1, 2)
+
+        first = SqlUnitOfWork(Session)
+        second = SqlUnitOfWork(Session)
+        with pytest.raises(ConcurrencyError):
+            with first, second:
+                c1 = first.calendars.get(owner)
+                c2 = second.calendars.get(owner)
+                c2.create_appointment("katie", since, until, "car wash")
+                second.commit()
+                c1.create_appointment("john", since, until, "rapair my car")
+                # the query flushes the stale calendar first
+                first.calendars.get_for_update(owner)
+
+        rows = list(s.execute("SELECT from_user FROM appointments"))
+        assert rows == [("katie",)]
+
+    def test_uow_commits_twice(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            c = uow.calendars.get(owner)
+            c.create_appointment(
+                "john",
+                datetime(2000, 1, 1, 1),
+                datetime(2000, 1, 1, 2),
+                "rapair my car",
+            )
+            uow.commit()
+            # the first commit expired the calendar
+            uow.commit()
+
+        [[version]] = s.execute("SELECT version FROM calendars")
+        assert version == 2
+
+    def test_uow_nested_rollback_keeps_outer_changes(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            c = uow.calendars.get(owner)
+            c.create_appointment(
+                "john",
+                datetime(2000, 1, 1, 1),
+                datetime(2000, 1, 1, 2),
+                "rapair my car",
+            )
+            try:
+                with uow:
+                    c.create_appointment(
+                        "katie",
+                        datetime(2000, 1, 1, 3),
+                        datetime(2000, 1, 1, 4),
+                        "car wash",
+                    )
+                    uow.session.flush()
+                    raise ArithmeticError
+            except ArithmeticError:
+                pass
+            with uow:
+                c = uow.calendars.get(owner)
+                c.create_appointment(
+                    "sam",
+                    datetime(2000, 1, 1, 5),
+                    datetime(2000, 1, 1, 6),
+                    "new tires",
+                )
+                uow.commit()
+            uow.commit()
+
+        rows = list(s.execute("SELECT from_user FROM appointments"))
+        assert sorted(rows) == [("john",), ("sam",)]
+
+    def test_uow_nested_rollback_restores_calendar(self, Session):
+        s = Session()
+        owner = "bob"
+        insert_calendar(s, owner)
+        for from_user in ("john", "katie"):
+            insert_appointment(
+                s,
+                owner,
+                from_user,
+                datetime(2000, 1, 1, 1),
+                datetime(2000, 1, 1, 2),
+                "rapair my car",
+                False,
+            )
+
+        uow = SqlUnitOfWork(Session)
+        with uow:
+            c = uow.calendars.get(owner)
+            try:
+                with uow:
+                    # rejects the appointment of katie
+                    c.accept_appointment(c.get_appointment(1))
+                    uow.session.flush()
+                    raise ArithmeticError
+            except ArithmeticError:
+                pass
+            c.accept_appointment(c.get_appointment(2))
+            uow.commit()
+
+        rows = list(s.execute("SELECT from_user, accepted FROM appointments"))
+        assert rows == [("katie", True)]
+
+    def test_uow_keeps_a_session_per_thread(self, Session, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'timetable.db'}")
+        metadata.create_all(engine)
+        uow = SqlUnitOfWork(sessionmaker(bind=engine))
+        inside = threading.Barrier(2)
+        sessions = {}
+
+        def create_calendar(owner):
+            with uow:
+                inside.wait()
+                uow.calendars.add(Calendar(owner=owner))
+                sessions[owner] = uow.session
+                inside.wait()
+                uow.commit()
+
+        threads = [
+            threading.Thread(target=create_calendar, args=(owner,))
+            for owner in ("bob", "katie")
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert sessions["bob"] is not sessions["katie"]
+        rows = engine.execute("SELECT owner FROM calendars ORDER BY owner")
+        assert list(rows) == [("bob",), ("katie",)]
+
+    def test_uow_gives_child_tasks_their_own_session(self, Session):
+        uow = SqlUnitOfWork(Session)
+
+        async def child():
+            with pytest.raises(RuntimeError):
+                uow.session
+            with uow:
+                uow.calendars.add(Calendar(owner="katie"))
+                uow.commit()
+                return uow.session
+
+        async def parent():
+            with uow:
+                session = uow.session
+                uow.calendars.add(Calendar(owner="bob"))
+                child_session = await asyncio.create_task(child())
+                assert uow.session is session
+                uow.commit()
+            return session, child_session
+
+        session, child_session = asyncio.run(parent())
+
+        assert session is not child_session
+        rows = Session().execute("SELECT owner FROM calendars ORDER BY owner")
+        assert list(rows) == [("bob",), ("katie",)]
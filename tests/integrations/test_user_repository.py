@@ -1,9 +1,17 @@
+from datetime import datetime
+
 import pytest
+from sqlalchemy import event
 
 from timetable.adapters.repository import DoesNotExistsError, SqlUserRepository
 from timetable.domain.user import Client, Service
 
-from tests.utils import insert_client, insert_service
+from tests.utils import (
+    insert_appointment,
+    insert_calendar,
+    insert_client,
+    insert_service,
+)
 
 
 def test_repository_can_add_client(Session):
@@ -117,3 +125,120 @@ def test_repository_can_list(Session):
     assert u2.email == "bob@dot.com"
     assert u2.password == "123"
     assert u2.tags == ["warsaw", "mechanic"]
+
+
+def test_repository_can_search_by_tags(Session):
+    session = Session()
+    insert_client(session, "john", "john@dot.com", "123")
+    insert_service(
+        session, "bob", "bob@dot.com", "123", ["warsaw", "mechanic"]
+    )
+    insert_service(session, "katie", "katie@dot.com", "123", ["warsaw"])
+    insert_service(session, "sam", "sam@dot.com", "123", [])
+    repository = SqlUserRepository(session)
+
+    assert repository.search_by_tags(["mechanic", "warsaw"]) == [
+        ("bob", ["warsaw", "mechanic"])
+    ]
+    assert repository.search_by_tags(["warsaw", "warsaw"]) == [
+        ("bob", ["warsaw", "mechanic"]),
+        ("katie", ["warsaw"]),
+    ]
+    assert sorted(repository.search_by_tags([])) == [
+        ("bob", ["warsaw", "mechanic"]),
+        ("katie", ["warsaw"]),
+        ("sam", []),
+    ]
+    assert repository.search_by_tags(["doctor"]) == []
+
+
+def test_repository_searches_services_free_in_window(Session):
+    session = Session()
+    for name in ("bob", "elizabeth", "katie"):
+        insert_service(session, name, f"{name}@dot.com", "123", ["mechanic"])
+        insert_calendar(session, name)
+    insert_service(session, "sam", "sam@dot.com", "123", ["doctor"])
+    insert_calendar(session, "sam")
+    insert_appointment(
+        session,
+        "bob",
+        "john",
+        datetime(2000, 1, 1, 1),
+        datetime(2000, 1, 1, 3),
+        "mechanic needed",
+        True,
+    )
+    insert_appointment(
+        session,
+        "elizabeth",
+        "john",
+        datetime(2000, 1, 1, 1),
+        datetime(2000, 1, 1, 3),
+        "engine check",
+        False,
+    )
+    insert_appointment(
+        session,
+        "katie",
+        "john",
+        datetime(2000, 1, 1, 3, 30),
+        datetime(2000, 1, 1, 4),
+        "car repair",
+        True,
+    )
+    repository = SqlUserRepository(session)
+
+    found = repository.search_by_tags(
+        ["mechanic"], datetime(2000, 1, 1, 2), datetime(2000, 1, 1, 3)
+    )
+
+    assert sorted(found) == [
+        ("elizabeth", ["mechanic"]),
+        ("katie", ["mechanic"]),
+    ]
+
+
+def count_queries(session):
+    statements = []
+    event.listen(
+        session.get_bind(),
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return statements
+
+
+def test_repository_loads_service_with_tags_in_two_queries(Session):
+    session = Session()
+    insert_client(session, "john", "john@dot.com", "123")
+    insert_service(
+        session, "bob", "bob@dot.com", "123", ["warsaw", "mechanic"]
+    )
+    insert_service(session, "katie", "katie@dot.com", "123", ["warsaw"])
+    session.close()
+
+    session = Session()
+    statements = count_queries(session)
+    u = SqlUserRepository(session).get("bob")
+    assert u.tags == ["warsaw", "mechanic"]
+    assert len(statements) == 2
+
+    session = Session()
+    statements.clear()
+    users = SqlUserRepository(session).list()
+    assert [u.to_dict() for u in users]
+    assert len(statements) == 2
+
+
+def test_repository_loader_options_are_configurable(Session):
+    session = Session()
+    insert_service(session, "bob", "bob@dot.com", "123", ["warsaw"])
+    insert_service(session, "katie", "katie@dot.com", "123", ["warsaw"])
+    session.close()
+
+    session = Session()
+    statements = count_queries(session)
+    repository = SqlUserRepository(session, polymorphic=(), loader_options=[])
+    users = repository.list()
+    assert [u.tags for u in users] == [["warsaw"], ["warsaw"]]
+    assert len(statements) == 3
@@ -275,3 +275,269 @@ def test_can_list_appoitnments():
     )
 
     assert cal.list_appointments() == [a1, a2]
+
+
+def test_accept_appointment_keeps_not_colliding_pending():
+    cal = Calendar(owner="katie")
+
+    a1 = cal.create_appointment(
+        from_user="john",
+        since=datetime(2020, 1, 1, 12, 0, 0),
+        until=datetime(2020, 1, 1, 13, 0, 0),
+        description="need doctor",
+    )
+    a2 = cal.create_appointment(
+        from_user="bob",
+        since=datetime(2020, 1, 1, 13, 0, 0),
+        until=datetime(2020, 1, 1, 14, 0, 0),
+        description="need car repair",
+    )
+    cal.accept_appointment(a1)
+    cal.accept_appointment(a2)
+
+    assert cal.list_appointments() == [a1, a2]
+    assert a1.accepted and a2.accepted
+
+
+def test_accept_accepted_appointment_again():
+    cal = Calendar(owner="katie")
+
+    a = cal.create_appointment(
+        from_user="john",
+        since=datetime(2020, 1, 1, 12, 0, 0),
+        until=datetime(2020, 1, 1, 13, 0, 0),
+        description="need doctor",
+    )
+    cal.accept_appointment(a)
+
+    assert cal.accept_appointment(a) is a
+    assert cal.list_appointments() == [a]
+
+
+def test_cannot_get_appointment_removed_by_accept():
+    cal = Calendar(owner="katie")
+
+    a1 = cal.create_appointment(
+        from_user="john",
+        since=datetime(2020, 1, 1, 12, 0, 0),
+        until=datetime(2020, 1, 1, 13, 0, 0),
+        description="need doctor",
+    )
+    a2 = cal.create_appointment(
+        from_user="bob",
+        since=datetime(2020, 1, 1, 12, 30, 0),
+        until=datetime(2020, 1, 1, 13, 30, 0),
+        description="need car repair",
+    )
+    assert cal.get_appointment(a2.id) == a2
+
+    cal.accept_appointment(a1)
+
+    assert cal.get_appointment(a1.id) == a1
+    with pytest.raises(DoesNotExistsError):
+        cal.get_appointment(a2.id)
+
+
+def test_create_appointments_reports_conflicts():
+    cal = Calendar(owner="katie")
+
+    a = cal.create_appointment(
+        from_user="john",
+        since=datetime(2020, 1, 1, 12, 0, 0),
+        until=datetime(2020, 1, 1, 13, 0, 0),
+        description="need doctor",
+    )
+    cal.accept_appointment(a)
+
+    [b1, b2, b3] = cal.create_appointments(
+        [
+            (
+                "bob",
+                datetime(2020, 1, 1, 11, 0, 0),
+                datetime(2020, 1, 1, 12, 0, 0),
+                "need car repair",
+            ),
+            (
+                "bob",
+                datetime(2020, 1, 1, 12, 30, 0),
+                datetime(2020, 1, 1, 14, 0, 0),
+                "need car repair",
+            ),
+            (
+                "elizabeth",
+                datetime(2020, 1, 1, 13, 0, 0),
+                datetime(2020, 1, 1, 14, 0, 0),
+                "need doctor",
+            ),
+        ]
+    )
+
+    assert b2 is None
+    assert b1.from_user == "bob" and not b1.accepted
+    assert b3.from_user == "elizabeth" and not b3.accepted
+    assert len({a.id, b1.id, b3.id}) == 3
+    assert cal.list_appointments() == [a, b1, b3]
+    assert cal.get_appointment(b3.id) == b3
+
+
+def test_create_appointments_rejects_invalid_batch():
+    cal = Calendar(owner="katie")
+
+    since = datetime(2020, 1, 1, 12, 0, 0)
+    with pytest.raises(ValueError):
+        cal.create_appointments(
+            [
+                ("bob", since, since + timedelta(hours=1), "car repair"),
+                ("john", since, since, "need doctor"),
+            ]
+        )
+    assert cal.list_appointments() == []
+
+
+def test_free_slots_between_accepted():
+    cal = Calendar(owner="katie")
+
+    for hour, accept in ((9, True), (10, False), (12, True), (15, True)):
+        a = cal.create_appointment(
+            from_user="john",
+            since=datetime(2020, 1, 1, hour, 0, 0),
+            until=datetime(2020, 1, 1, hour + 1, 0, 0),
+            description="need doctor",
+        )
+        if accept:
+            cal.accept_appointment(a)
+
+    slots = cal.free_slots(
+        datetime(2020, 1, 1, 9, 30, 0),
+        datetime(2020, 1, 1, 18, 0, 0),
+        timedelta(hours=2),
+    )
+
+    assert slots == [
+        (datetime(2020, 1, 1, 10, 0, 0), datetime(2020, 1, 1, 12, 0, 0)),
+        (datetime(2020, 1, 1, 13, 0, 0), datetime(2020, 1, 1, 15, 0, 0)),
+        (datetime(2020, 1, 1, 16, 0, 0), datetime(2020, 1, 1, 18, 0, 0)),
+    ]
+
+
+def test_free_slots_of_empty_calendar_is_whole_window():
+    cal = Calendar(owner="katie")
+    since = datetime(2020, 1, 1, 9, 0, 0)
+    until = datetime(2020, 1, 1, 17, 0, 0)
+
+    assert cal.free_slots(since, until) == [(since, until)]
+    with pytest.raises(ValueError):
+        cal.free_slots(until, since)
+
+
+def test_recurring_appointment_blocks_occurrences():
+    cal = Calendar(owner="katie")
+    first = datetime(2020, 1, 6, 12, 0, 0)
+    week = timedelta(weeks=1)
+
+    r = cal.add_recurring_appointment(
+        from_user="john",
+        since=first,
+        until=first + timedelta(hours=1),
+        description="weekly checkup",
+        every=week,
+    )
+
+    with pytest.raises(NotAvailableError):
+        cal.create_appointment(
+            from_user="bob",
+            since=first + 52 * week,
+            until=first + 52 * week + timedelta(minutes=30),
+            description="need doctor",
+        )
+    a = cal.create_appointment(
+        from_user="bob",
+        since=first + timedelta(hours=1),
+        until=first + timedelta(hours=2),
+        description="need doctor",
+    )
+    assert cal.list_appointments() == [a]
+
+    cal.cancel_occurrence(r.id, first + 52 * week)
+    cal.create_appointment(
+        from_user="bob",
+        since=first + 52 * week,
+        until=first + 52 * week + timedelta(minutes=30),
+        description="need doctor",
+    )
+
+
+def test_recurring_appointment_rejects_colliding_requests():
+    cal = Calendar(owner="katie")
+    first = datetime(2020, 1, 6, 12, 0, 0)
+    week = timedelta(weeks=1)
+
+    a1 = cal.create_appointment(
+        from_user="bob",
+        since=first + 2 * week,
+        until=first + 2 * week + timedelta(hours=1),
+        description="need doctor",
+    )
+    a2 = cal.create_appointment(
+        from_user="bob",
+        since=first + 2 * week + timedelta(hours=1),
+        until=first + 2 * week + timedelta(hours=2),
+        description="need doctor",
+    )
+    cal.add_recurring_appointment(
+        from_user="john",
+        since=first,
+        until=first + timedelta(hours=1),
+        description="weekly checkup",
+        every=week,
+    )
+
+    assert cal.list_appointments() == [a2]
+    with pytest.raises(DoesNotExistsError):
+        cal.get_appointment(a1.id)
+    with pytest.raises(NotAvailableError):
+        cal.add_recurring_appointment(
+            from_user="elizabeth",
+            since=first + timedelta(weeks=4, minutes=30),
+            until=first + timedelta(weeks=4, hours=1),
+            description="fortnightly checkup",
+            every=2 * week,
+        )
+    with pytest.raises(NotAvailableError):
+        cal.add_recurring_appointment(
+            from_user="sam",
+            since=first + timedelta(days=1),
+            until=first + timedelta(days=1, hours=1),
+            description="drifting checkup",
+            every=week + timedelta(seconds=1),
+        )
+    cal.accept_appointment(a2)
+    with pytest.raises(NotAvailableError):
+        cal.add_recurring_appointment(
+            from_user="elizabeth",
+            since=first + timedelta(hours=1),
+            until=first + timedelta(hours=2),
+            description="weekly checkup",
+            every=week,
+        )
+
+
+def test_free_slots_skip_recurring_occurrences():
+    cal = Calendar(owner="katie")
+    first = datetime(2020, 1, 6, 12, 0, 0)
+    cal.add_recurring_appointment(
+        from_user="john",
+        since=first,
+        until=first + timedelta(hours=1),
+        description="daily break",
+        every=timedelta(days=1),
+    )
+
+    slots = cal.free_slots(
+        datetime(2020, 3, 1, 9, 0, 0), datetime(2020, 3, 1, 17, 0, 0)
+    )
+
+    assert slots == [
+        (datetime(2020, 3, 1, 9, 0, 0), datetime(2020, 3, 1, 12, 0, 0)),
+        (datetime(2020, 3, 1, 13, 0, 0), datetime(2020, 3, 1, 17, 0, 0)),
+    ]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from timetable.domain.appointment import Appointment
+from timetable.domain.calendar import Calendar
+from timetable.domain.columns import AppointmentColumns, from_epoch, to_epoch
+
+
+def test_epoch_round_trip():
+    dt = datetime(2020, 1, 1, 12, 30, 15, 123)
+    assert from_epoch(to_epoch(dt)) == dt
+
+
+def test_columns_sorted_and_masked_by_overlap():
+    a1 = Appointment(
+        id=1,
+        from_user="bob",
+        since=datetime(2020, 1, 1, 14),
+        until=datetime(2020, 1, 1, 15),
+        description="appointment",
+        accepted=True,
+    )
+    a2 = Appointment(
+        id=2,
+        from_user="john",
+        since=datetime(2020, 1, 1, 12),
+        until=datetime(2020, 1, 1, 13),
+        description="car repair",
+        accepted=False,
+    )
+    columns = AppointmentColumns([a1, a2])
+
+    assert len(columns) == 2
+    assert list(columns.ids) == [2, 1]
+    assert list(
+        columns.overlapping(datetime(2020, 1, 1, 12), datetime(2020, 1, 1, 14))
+    ) == [True, False]
+    assert columns.is_free(datetime(2020, 1, 1, 12), datetime(2020, 1, 1, 14))
+    assert not columns.is_free(
+        datetime(2020, 1, 1, 14, 30), datetime(2020, 1, 1, 16)
+    )
+    assert columns.accepted_intervals() == [(a1.since, a1.until)]
+
+
+def test_calendar_columns_follow_changes():
+    cal = Calendar(owner="katie")
+    a = cal.create_appointment(
+        from_user="john",
+        since=datetime(2020, 1, 1, 12),
+        until=datetime(2020, 1, 1, 13),
+        description="need doctor",
+    )
+    assert cal.columns().accepted_intervals() == []
+
+    cal.accept_appointment(a)
+
+    assert cal.columns().accepted_intervals() == [(a.since, a.until)]
@@ -0,0 +1,125 @@
+from datetime import datetime
+from threading import Event, current_thread
+
+from pytest import fixture, raises
+from tests.fakes import FakeUnitOfWork
+
+from timetable.domain.command import (
+    AcceptAppointment,
+    Command,
+    CreateAppointment,
+    CreateClient,
+)
+from timetable.domain.exceptions import DoesNotExistsError
+from timetable.service_layer.executor import CalendarExecutor, calendar_owner
+from timetable.bootstrap import bootstrap
+
+
+@fixture
+def recording_mb():
+    handled = []
+    mb = bootstrap(False, FakeUnitOfWork())
+
+    def handle_command(c):
+        if getattr(c, "fail", False):
+            raise DoesNotExistsError("no such calendar")
+        if getattr(c, "error", None) is not None:
+            raise c.error
+        if getattr(c, "wait", None) is not None:
+            assert c.wait.wait(1)
+        handled.append((current_thread().name, c))
+
+    mb.command_handlers = {
+        AcceptAppointment: handle_command,
+        CreateAppointment: handle_command,
+        CreateClient: handle_command,
+    }
+    mb.handled = handled
+    return mb
+
+
+def create(to_user):
+    return CreateAppointment(
+        to_user,
+        "john",
+        datetime(2000, 1, 1, 1),
+        datetime(2000, 1, 1, 2),
+        "mechanic needed",
+    )
+
+
+def test_calendar_owner():
+    assert calendar_owner(create("bob")) == "bob"
+    assert calendar_owner(AcceptAppointment("bob", 0)) == "bob"
+    assert calendar_owner(CreateClient("john", "john@dot.com", "123")) is None
+    assert calendar_owner(Command()) is None
+
+
+def test_same_calendar_runs_in_order_on_one_lane(recording_mb):
+    commands = [create("bob"), AcceptAppointment("bob", 0), create("bob")]
+
+    with CalendarExecutor(recording_mb, lanes=4) as executor:
+        futures = [executor.submit(c) for c in commands]
+        for f in futures:
+            f.result(1)
+
+    assert [c for _, c in recording_mb.handled] == commands
+    assert len({name for name, _ in recording_mb.handled}) == 1
+
+
+def test_calendars_on_different_lanes_run_in_parallel(recording_mb):
+    with CalendarExecutor(recording_mb, lanes=2) as executor:
+        owners = {}
+        for name in ("bob", "katie", "steve", "anna"):
+            owners.setdefault(executor.lane(create(name)), name)
+        assert len(owners) == 2
+        blocked = create(owners[0])
+        blocked.wait = Event()
+
+        first = executor.submit(blocked)
+        # would time out if the other lane waited for the blocked one
+        executor.handle(create(owners[1]))
+        blocked.wait.set()
+        first.result(1)
+
+    assert [c.to_user for _, c in recording_mb.handled] == [
+        owners[1],
+        owners[0],
+    ]
+
+
+def test_errors_are_set_on_the_future(recording_mb):
+    failing = AcceptAppointment("bob", 0)
+    failing.fail = True
+
+    with CalendarExecutor(recording_mb, lanes=2) as executor:
+        with raises(DoesNotExistsError):
+            executor.handle(failing)
+        executor.handle(AcceptAppointment("bob", 1))
+
+    assert [c.id for _, c in recording_mb.handled] == [1]
+
+
+class Fatal(BaseException):
+    pass
+
+
+def test_unexpected_errors_keep_the_lane_alive(recording_mb):
+    failing = AcceptAppointment("bob", 0)
+    failing.error = Fatal()
+
+    with CalendarExecutor(recording_mb, lanes=1) as executor:
+        # a dead lane would never resolve the futures
+        with raises(Fatal):
+            executor.submit(failing).result(1)
+        executor.submit(AcceptAppointment("bob", 1)).result(1)
+
+    assert [c.id for _, c in recording_mb.handled] == [1]
+
+
+def test_submit_after_shutdown_fails(recording_mb):
+    executor = CalendarExecutor(recording_mb, lanes=1)
+    executor.shutdown()
+
+    with raises(RuntimeError):
+        executor.submit(create("bob"))
@@ -8,6 +8,7 @@ from timetable.domain.command import (
     CreateClient,
     CreateService,
     CreateAppointment,
+    CreateAppointments,
     AcceptAppointment,
 )
 from timetable.service_layer.message_bus import MessageBus
@@ -158,6 +159,50 @@ class TestCreateAppointment:
         assert not fake_mb.uow.commited
 
 
+class TestCreateAppointments:
+    def test_create_appointments_commits_free_ones(self, fake_mb):
+        to_user = "bob"
+        cu = CreateService(to_user, "bob@dot.com", "123", ["mechanic"])
+        fake_mb.handle(cu)
+        fake_mb.handle(
+            CreateAppointment(
+                to_user,
+                "john",
+                datetime(2000, 1, 1, 1),
+                datetime(2000, 1, 1, 2),
+                "mechanic needed",
+            )
+        )
+        calendar_stored = fake_mb.uow.calendars.list()[0]
+        [app] = calendar_stored.list_appointments()
+        fake_mb.handle(AcceptAppointment(to_user, app.id))
+
+        fake_mb.uow.commited = False
+        ca = CreateAppointments(
+            to_user,
+            [
+                (
+                    "katie",
+                    datetime(2000, 1, 1, 1, 30),
+                    datetime(2000, 1, 1, 3),
+                    "car repair",
+                ),
+                (
+                    "katie",
+                    datetime(2000, 1, 1, 2),
+                    datetime(2000, 1, 1, 3),
+                    "car repair",
+                ),
+            ],
+        )
+        fake_mb.handle(ca)
+
+        [_, app_stored] = calendar_stored.list_appointments()
+        assert app_stored.since == datetime(2000, 1, 1, 2)
+        assert not app_stored.accepted
+        assert fake_mb.uow.commited
+
+
 class TestAcceptAppointment:
     def test_accept_appointment_when_free(self, fake_mb):
         to_user = "bob"
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+from timetable.domain.appointment import Appointment
+from timetable.domain import interval
+from timetable.domain.interval import DisjointIntervalIndex, IntervalIndex
+
+
+def make_appointment(id, since, hours):
+    return Appointment(
+        id=id,
+        from_user="bob",
+        since=since,
+        until=since + timedelta(hours=hours),
+        description="appointment",
+        accepted=False,
+    )
+
+
+def test_overlapping_returns_only_colliding():
+    start = datetime(2020, 1, 1)
+    a1 = make_appointment(1, start, 1)
+    a2 = make_appointment(2, start + timedelta(hours=1), 1)
+    a3 = make_appointment(3, start + timedelta(hours=5), 1)
+    index = IntervalIndex([a3, a1, a2])
+
+    found = list(
+        index.overlapping(
+            start + timedelta(minutes=30), start + timedelta(minutes=90)
+        )
+    )
+
+    assert found == [a1, a2]
+
+
+def test_overlapping_finds_long_interval_starting_early():
+    start = datetime(2020, 1, 1)
+    long = make_appointment(1, start, 48)
+    short = make_appointment(2, start + timedelta(hours=1), 1)
+    index = IntervalIndex([long, short])
+
+    found = list(
+        index.overlapping(
+            start + timedelta(hours=30), start + timedelta(hours=31)
+        )
+    )
+
+    assert found == [long]
+
+
+def test_overlapping_skips_adjacent_and_excluded():
+    start = datetime(2020, 1, 1)
+    a1 = make_appointment(1, start, 1)
+    a2 = make_appointment(2, start + timedelta(hours=1), 1)
+    index = IntervalIndex([a1, a2])
+
+    assert list(index.overlapping(a2.since, a2.until, exclude=a2)) == []
+
+
+def test_add_and_remove():
+    start = datetime(2020, 1, 1)
+    a1 = make_appointment(1, start, 1)
+    a2 = make_appointment(2, start, 1)
+    index = IntervalIndex()
+    index.add(a2)
+    index.add(a1)
+
+    assert list(index) == [a1, a2]
+
+    index.remove(a1)
+
+    assert a1 not in index
+    assert a2 in index
+    assert list(index.overlapping(a1.since, a1.until)) == [a2]
+
+
+def test_overlapping_across_blocks(monkeypatch):
+    monkeypatch.setattr(interval, "_LOAD", 2)
+    start = datetime(2020, 1, 1)
+    long = make_appointment(0, start, 100)
+    short = [
+        make_appointment(id, start + timedelta(hours=2 * id), 1)
+        for id in range(1, 20)
+    ]
+    index = IntervalIndex()
+    for a in [long] + short:
+        index.add(a)
+    index.remove(short[0])
+
+    assert list(index) == [long] + short[1:]
+    assert list(
+        index.overlapping(
+            start + timedelta(hours=10), start + timedelta(hours=13)
+        )
+    ) == [long, short[4], short[5]]
+    assert (
+        list(
+            index.overlapping(
+                start + timedelta(hours=200), start + timedelta(hours=201)
+            )
+        )
+        == []
+    )
+
+
+def test_disjoint_overlapping_checks_previous_neighbour():
+    start = datetime(2020, 1, 1)
+    a1 = make_appointment(1, start, 3)
+    a2 = make_appointment(2, start + timedelta(hours=3), 1)
+    a3 = make_appointment(3, start + timedelta(hours=5), 1)
+    index = DisjointIntervalIndex([a3, a1, a2])
+
+    found = list(
+        index.overlapping(
+            start + timedelta(hours=2), start + timedelta(hours=5)
+        )
+    )
+
+    assert found == [a1, a2]
+    assert list(index.overlapping(a3.since, a3.until, exclude=a3)) == []
@@ -1,9 +1,10 @@
-from pytest import fixture
+from pytest import fixture, raises
 from tests.fakes import FakeUnitOfWork
 
 from timetable.domain.event import Event
 from timetable.domain.calendar import Calendar
 from timetable.domain.command import Command
+from timetable.domain.exceptions import ConcurrencyError
 from timetable.bootstrap import bootstrap
 
 
@@ -36,6 +37,22 @@ def test_mb2():
     return mb
 
 
+@fixture
+def conflicting_mb():
+    co_s = []
+    mb = bootstrap(False, FakeUnitOfWork())
+
+    def handle_command(c):
+        co_s.append(c)
+        if len(co_s) <= mb.conflicts:
+            raise ConcurrencyError
+
+    mb.command_handlers = {Command: handle_command}
+    mb.backoff = 0
+    mb.co_s = co_s
+    return mb
+
+
 class TestMessageBus:
     def test_message_bus_handles_event(self, test_mb):
         e = Event()
@@ -59,3 +76,25 @@ class TestMessageBus:
         [o] = test_mb2.ev_s
         assert isinstance(o, Event)
         assert test_mb2.co_s == [c]
+
+    def test_message_bus_retries_concurrent_commands(self, conflicting_mb):
+        conflicting_mb.conflicts = 2
+        c = Command()
+        conflicting_mb.handle(c)
+        assert conflicting_mb.co_s == [c, c, c]
+        assert conflicting_mb.retries == 2
+
+    def test_message_bus_gives_up_after_max_retries(self, conflicting_mb):
+        conflicting_mb.conflicts = 10
+        with raises(ConcurrencyError):
+            conflicting_mb.handle(Command())
+        assert len(conflicting_mb.co_s) == conflicting_mb.max_retries + 1
+        assert conflicting_mb.retries == conflicting_mb.max_retries
+
+    def test_message_bus_handles_many(self, conflicting_mb):
+        conflicting_mb.conflicts = 0
+        c1, c2 = Command(), Command()
+        errors = conflicting_mb.handle_many([c1, c2])
+        assert errors == [None, None]
+        assert conflicting_mb.co_s == [c1, c2]
+        assert conflicting_mb.uow.commited
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from timetable.domain.recurrence import RecurringAppointment
+
+WEEK = timedelta(weeks=1)
+
+
+def weekly(since, hours=1, repeat_until=None, id=1):
+    return RecurringAppointment(
+        id=id,
+        from_user="bob",
+        since=since,
+        until=since + timedelta(hours=hours),
+        description="standing appointment",
+        every=WEEK,
+        repeat_until=repeat_until,
+    )
+
+
+def test_occurrences_within_window():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first)
+
+    found = list(r.occurrences(datetime(2020, 1, 10), datetime(2020, 1, 27)))
+
+    assert found == [
+        (first + WEEK, first + WEEK + timedelta(hours=1)),
+        (first + 2 * WEEK, first + 2 * WEEK + timedelta(hours=1)),
+    ]
+
+
+def test_occurrences_skip_exceptions_and_end():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first, repeat_until=first + 3 * WEEK)
+    r.exceptions.append(first + WEEK)
+
+    found = [s for s, _ in r.occurrences(first, first + 10 * WEEK)]
+
+    assert found == [first, first + 2 * WEEK]
+
+
+def test_collides_with_interval():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first)
+    later = first + 5 * WEEK
+
+    assert r.collides_with(
+        later + timedelta(minutes=30), later + timedelta(hours=2)
+    )
+    assert not r.collides_with(later + timedelta(hours=1), later + WEEK)
+    assert not r.collides_with(first - WEEK, first)
+
+
+def test_collides_with_rule():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first)
+    other_day = weekly(first + timedelta(days=1), id=2)
+    two_weekly = RecurringAppointment(
+        id=3,
+        from_user="john",
+        since=first + 3 * WEEK + timedelta(minutes=30),
+        until=first + 3 * WEEK + timedelta(hours=2),
+        description="standing appointment",
+        every=2 * WEEK,
+    )
+
+    assert not r.collides_with_rule(other_day)
+    assert r.collides_with_rule(two_weekly)
+    assert two_weekly.collides_with_rule(r)
+
+
+def test_collides_with_rule_of_coprime_period():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first)
+    drifting = RecurringAppointment(
+        id=2,
+        from_user="john",
+        since=first + timedelta(days=1),
+        until=first + timedelta(days=1, hours=1),
+        description="standing appointment",
+        every=WEEK + timedelta(seconds=1),
+    )
+    bounded = weekly(first, repeat_until=first + 10 * WEEK)
+
+    # drifts a second a week, so sooner or later it hits every hour
+    assert r.collides_with_rule(drifting)
+    assert drifting.collides_with_rule(r)
+    assert not bounded.collides_with_rule(drifting)
+    assert not drifting.collides_with_rule(bounded)
+
+
+def test_collides_with_rule_forever_ignores_exceptions():
+    first = datetime(2020, 1, 6, 12)
+    two_weekly = RecurringAppointment(
+        id=1,
+        from_user="john",
+        since=first,
+        until=first + timedelta(hours=1),
+        description="standing appointment",
+        every=2 * WEEK,
+    )
+    four_weekly = RecurringAppointment(
+        id=2,
+        from_user="john",
+        since=first + WEEK,
+        until=first + WEEK + timedelta(hours=1),
+        description="standing appointment",
+        every=4 * WEEK,
+    )
+    r = weekly(first, id=3)
+    r.exceptions.append(first)
+
+    assert not two_weekly.collides_with_rule(four_weekly)
+    assert r.collides_with_rule(two_weekly)
+    assert r.collides_with_rule(four_weekly)
+
+
+def test_is_occurrence():
+    first = datetime(2020, 1, 6, 12)
+    r = weekly(first, repeat_until=first + 2 * WEEK)
+
+    assert r.is_occurrence(first + WEEK)
+    assert not r.is_occurrence(first + WEEK + timedelta(minutes=1))
+    assert not r.is_occurrence(first - WEEK)
+    assert not r.is_occurrence(first + 2 * WEEK)
+
+
+def test_cannot_create_self_overlapping_rule():
+    since = datetime(2020, 1, 6, 12)
+    with pytest.raises(ValueError):
+        RecurringAppointment(
+            id=1,
+            from_user="bob",
+            since=since,
+            until=since + timedelta(days=2),
+            description="standing appointment",
+            every=timedelta(days=1),
+        )
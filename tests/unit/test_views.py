@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from random import randint
 
 import pytest
@@ -8,12 +8,16 @@ from timetable.domain.command import (
     CreateService,
     CreateAppointment,
     AcceptAppointment,
+    CreateRecurringAppointment,
+    CancelOccurrence,
 )
 from timetable.service_layer.views import (
     get_user,
     list_appointments,
+    list_appointments_page,
     search_services,
     get_appointment,
+    get_free_slots,
 )
 from timetable.domain.exceptions import DoesNotExistsError
 
@@ -174,6 +178,144 @@ class TestListAppointments:
         assert app1_returned == model
 
 
+class TestListRecurringAppointments:
+    def setup_calendar(self, fake_mb):
+        fake_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+        fake_mb.handle(
+            CreateAppointment(
+                "bob",
+                "john",
+                datetime(2000, 1, 1, 10),
+                datetime(2000, 1, 1, 11),
+                "mechanic needed",
+            )
+        )
+        [a] = fake_mb.uow.calendars.get("bob").list_appointments()
+        fake_mb.handle(AcceptAppointment("bob", a.id))
+        fake_mb.handle(
+            CreateRecurringAppointment(
+                "bob",
+                "john",
+                datetime(2000, 1, 1, 8),
+                datetime(2000, 1, 1, 9),
+                "daily service",
+                timedelta(days=1),
+            )
+        )
+        [r] = fake_mb.uow.calendars.get("bob").list_recurring_appointments()
+        fake_mb.handle(CancelOccurrence("bob", r.id, datetime(2000, 1, 2, 8)))
+        return r
+
+    def test_list_appointments_with_occurrences(self, fake_mb):
+        self.setup_calendar(fake_mb)
+
+        listed = list_appointments("bob", "john", fake_mb.uow)
+        in_window = list_appointments(
+            "bob",
+            "john",
+            fake_mb.uow,
+            datetime(2000, 1, 1, 9),
+            datetime(2000, 1, 4),
+        )
+
+        assert [a["since"] for a in listed] == [
+            datetime(2000, 1, 1, 8),
+            datetime(2000, 1, 1, 10),
+        ]
+        assert [a["since"] for a in in_window] == [
+            datetime(2000, 1, 1, 10),
+            datetime(2000, 1, 3, 8),
+        ]
+
+    def test_list_appointments_page_with_occurrences(self, fake_mb):
+        r = self.setup_calendar(fake_mb)
+
+        first = list_appointments_page("bob", "bob", 2, None, fake_mb.uow)
+        second = list_appointments_page(
+            "bob", "bob", 2, first["next"], fake_mb.uow
+        )
+
+        assert [a["since"] for a in first["appointments"]] == [
+            datetime(2000, 1, 1, 8),
+            datetime(2000, 1, 1, 10),
+        ]
+        assert [a["since"] for a in second["appointments"]] == [
+            datetime(2000, 1, 3, 8),
+            datetime(2000, 1, 4, 8),
+        ]
+        assert second["appointments"][0] == {
+            "id": r.id,
+            "from_user": "john",
+            "since": datetime(2000, 1, 3, 8),
+            "until": datetime(2000, 1, 3, 9),
+            "description": "daily service",
+            "accepted": True,
+            "recurring": True,
+        }
+        assert second["next"] is not None
+
+
+class TestListAppointmentsPage:
+    def setup_calendar(self, fake_mb):
+        fake_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+        for hour in (5, 1, 3, 7, 9):
+            fake_mb.handle(
+                CreateAppointment(
+                    "bob",
+                    "john",
+                    datetime(2000, 1, 1, hour),
+                    datetime(2000, 1, 1, hour + 1),
+                    "mechanic needed",
+                )
+            )
+        c = fake_mb.uow.calendars.get("bob")
+        for a in c.list_appointments():
+            if a.since.hour in (3, 7, 9):
+                fake_mb.handle(AcceptAppointment("bob", a.id))
+
+    def test_list_appointments_page_owned(self, fake_mb):
+        self.setup_calendar(fake_mb)
+
+        hours = []
+        after = None
+        while True:
+            page = list_appointments_page("bob", "bob", 2, after, fake_mb.uow)
+            hours.append([a["since"].hour for a in page["appointments"]])
+            after = page["next"]
+            if after is None:
+                break
+
+        assert hours == [[1, 3], [5, 7], [9]]
+
+    def test_list_appointments_page_unowned(self, fake_mb):
+        self.setup_calendar(fake_mb)
+
+        first = list_appointments_page("bob", "john", 2, None, fake_mb.uow)
+        last = list_appointments_page(
+            "bob", "john", 2, first["next"], fake_mb.uow
+        )
+
+        assert first["appointments"] == [
+            {
+                "since": datetime(2000, 1, 1, h),
+                "until": datetime(2000, 1, 1, h + 1),
+            }
+            for h in (3, 7)
+        ]
+        assert [a["since"].hour for a in last["appointments"]] == [9]
+        assert last["next"] is None
+
+    def test_list_appointments_page_invalid_cursor(self, fake_mb):
+        self.setup_calendar(fake_mb)
+
+        with pytest.raises(ValueError):
+            list_appointments_page("bob", "bob", 2, "nonsense", fake_mb.uow)
+
+    def test_list_appointments_page_unexisting_service(self, fake_mb):
+        with pytest.raises(DoesNotExistsError):
+            list_appointments_page("bob", "bob", 2, None, fake_mb.uow)
+
+
 class TestSearchServices:
     def test_search_services_by_tag(self, fake_mb):
         tags_searched = ["mechanic", "warsaw"]
@@ -358,6 +500,32 @@ class TestSearchServices:
 
         assert found == []
 
+    def test_search_services_available_in_window(self, fake_mb):
+        fake_mb.handle(CreateService("bob", "bob@dot.com", "123", ["car"]))
+        fake_mb.handle(CreateService("katie", "katie@dot.com", "123", ["car"]))
+        for to_user in ("bob", "katie"):
+            fake_mb.handle(
+                CreateAppointment(
+                    to_user,
+                    "john",
+                    datetime(2000, 1, 1, 10),
+                    datetime(2000, 1, 1, 11),
+                    "mechanic needed",
+                )
+            )
+        [bob_calendar, _] = fake_mb.uow.calendars.list()
+        [app] = bob_calendar.list_appointments()
+        fake_mb.handle(AcceptAppointment("bob", app.id))
+
+        found = search_services(
+            ["car"],
+            fake_mb.uow,
+            datetime(2000, 1, 1, 10, 30),
+            datetime(2000, 1, 1, 12),
+        )
+
+        assert found == [{"account_name": "katie", "tags": ["car"]}]
+
 
 class TestGetAppointmentDetail:
     def test_get_appointment_detail_existing(self, fake_mb):
@@ -535,3 +703,95 @@ class TestGetAppointmentDetail:
             wrong_id = randint(1, 10)
         with pytest.raises(DoesNotExistsError):
             get_appointment(to_user, wrong_id, fake_mb.uow)
+
+
+class TestGetFreeSlots:
+    def test_get_free_slots(self, fake_mb):
+        to_user = "bob"
+        cu = CreateService(to_user, "bob@dot.com", "123", ["mechanic"])
+        ca = CreateAppointment(
+            to_user,
+            "john",
+            datetime(2000, 1, 1, 10),
+            datetime(2000, 1, 1, 11),
+            "mechanic needed",
+        )
+        fake_mb.handle(cu)
+        fake_mb.handle(ca)
+        calendar_stored = fake_mb.uow.calendars.list()[0]
+        [app] = calendar_stored.list_appointments()
+        fake_mb.handle(AcceptAppointment(to_user, app.id))
+
+        slots = get_free_slots(
+            to_user,
+            datetime(2000, 1, 1, 8),
+            datetime(2000, 1, 1, 12),
+            timedelta(hours=1),
+            fake_mb.uow,
+        )
+
+        assert slots == [
+            {"since": datetime(2000, 1, 1, 8), "until": app.since},
+            {"since": app.until, "until": datetime(2000, 1, 1, 12)},
+        ]
+
+    def test_get_free_slots_around_recurring(self, fake_mb):
+        to_user = "bob"
+        fake_mb.handle(
+            CreateService(to_user, "bob@dot.com", "123", ["mechanic"])
+        )
+        fake_mb.handle(
+            CreateRecurringAppointment(
+                to_user,
+                "john",
+                datetime(2000, 1, 1, 9),
+                datetime(2000, 1, 1, 10),
+                "weekly service",
+                timedelta(days=1),
+            )
+        )
+        [rule] = fake_mb.uow.calendars.get(
+            to_user
+        ).list_recurring_appointments()
+        fake_mb.handle(
+            CancelOccurrence(to_user, rule.id, datetime(2000, 1, 2, 9))
+        )
+
+        slots = get_free_slots(
+            to_user,
+            datetime(2000, 1, 1, 8),
+            datetime(2000, 1, 3, 8),
+            timedelta(hours=1),
+            fake_mb.uow,
+        )
+
+        assert slots == [
+            {
+                "since": datetime(2000, 1, 1, 8),
+                "until": datetime(2000, 1, 1, 9),
+            },
+            {
+                "since": datetime(2000, 1, 1, 10),
+                "until": datetime(2000, 1, 3, 8),
+            },
+        ]
+
+    def test_get_free_slots_unexisting_service(self, fake_mb):
+        with pytest.raises(DoesNotExistsError):
+            get_free_slots(
+                "bob",
+                datetime(2000, 1, 1, 8),
+                datetime(2000, 1, 1, 12),
+                timedelta(),
+                fake_mb.uow,
+            )
+
+    def test_get_free_slots_rejects_reversed_window(self, fake_mb):
+        fake_mb.handle(CreateService("bob", "bob@dot.com", "123", []))
+
+        for since, until in [
+            (datetime(2000, 1, 2), datetime(2000, 1, 1)),
+            (datetime(2000, 1, 1), datetime(2000, 1, 1)),
+        ]:
+            with pytest.raises(ValueError):
+                get_free_slots("bob", since, until, timedelta(), fake_mb.uow)
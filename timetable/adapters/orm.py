@@ -1,21 +1,29 @@
 from sqlalchemy import (
+    DDL,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    ForeignKeyConstraint,
+    Index,
     Integer,
+    Interval,
+    JSON,
     String,
     MetaData,
     Table,
     event,
+    func,
 )
 from sqlalchemy.ext.associationproxy import association_proxy
 
 from sqlalchemy.orm import mapper, relationship
 
+from timetable.config import get_exclusion_constraint
 from timetable.domain.appointment import Appointment
 from timetable.domain.user import User, Client, Service
 from timetable.domain.calendar import Calendar
+from timetable.domain.recurrence import RecurringAppointment
 
 metadata = MetaData()
 
@@ -24,6 +32,7 @@ calendars = Table(
     metadata,
     Column("owner", ForeignKey("services.account_name"), primary_key=True),
     Column("id_count", Integer),
+    Column("version", Integer, nullable=False, server_default="1"),
 )
 
 appointments = Table(
@@ -37,6 +46,81 @@ appointments = Table(
     Column("description", String, nullable=False),
     Column("accepted", Boolean, nullable=False),
 )
+Index(
+    "ix_appointments_calendar_accepted_span",
+    appointments.c.calendar_owner,
+    appointments.c.accepted,
+    appointments.c.since,
+    appointments.c.until,
+)
+Index("ix_appointments_from_user", appointments.c.from_user)
+Index(
+    "ix_appointments_calendar_since_id",
+    appointments.c.calendar_owner,
+    appointments.c.since,
+    appointments.c.id,
+)
+
+# Optional PostgreSQL storage mode: the database itself refuses two
+# accepted appointments of one calendar whose tsrange(since, until) overlap,
+# which also closes the race between concurrent workers. Other databases
+# (SQLite in tests) rely on the check done by Calendar alone.
+NO_OVERLAP_CONSTRAINT = "appointments_no_overlap"
+
+NO_OVERLAP_DDL = (
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist"),
+    DDL(
+        f"ALTER TABLE appointments ADD CONSTRAINT {NO_OVERLAP_CONSTRAINT} "
+        "EXCLUDE USING gist "
+        "(calendar_owner WITH =, tsrange(since, until) WITH &&) "
+        "WHERE (accepted)"
+    ),
+)
+
+for ddl in NO_OVERLAP_DDL:
+    event.listen(
+        appointments,
+        "after_create",
+        ddl.execute_if(
+            dialect="postgresql",
+            callable_=lambda *args, **kwargs: get_exclusion_constraint(),
+        ),
+    )
+
+recurring_appointments = Table(
+    "recurring_appointments",
+    metadata,
+    Column("calendar_owner", ForeignKey("calendars.owner"), primary_key=True),
+    Column("id", Integer, primary_key=True),
+    Column("from_user", String, nullable=False),
+    Column("until", DateTime, nullable=False),
+    Column("since", DateTime, nullable=False),
+    Column("description", String, nullable=False),
+    Column("every", Interval, nullable=False),
+    Column("repeat_until", DateTime),
+)
+
+
+class RecurrenceException:
+    def __init__(self, since):
+        self.since = since
+
+
+recurrence_exceptions = Table(
+    "recurrence_exceptions",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("calendar_owner", String, nullable=False),
+    Column("recurring_id", Integer, nullable=False),
+    Column("since", DateTime, nullable=False),
+    ForeignKeyConstraint(
+        ["calendar_owner", "recurring_id"],
+        [
+            "recurring_appointments.calendar_owner",
+            "recurring_appointments.id",
+        ],
+    ),
+)
 
 
 users = Table(
@@ -84,19 +168,50 @@ tags = Table(
     Column("tag", String(30)),
 )
 
+Index("ix_tags_tag_service", tags.c.tag, tags.c.service_account_name)
+
+# Events committed with the calendars that raised them, published later by
+# OutboxDispatcher. ``type`` is the dotted path of the event class.
+outbox = Table(
+    "outbox",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("type", String, nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column("created_at", DateTime, nullable=False, server_default=func.now()),
+    Column("processed_at", DateTime),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+)
+Index("ix_outbox_pending", outbox.c.processed_at, outbox.c.id)
+
 
 def start_mappers():
 
     mapper(
         Calendar,
         calendars,
+        version_id_col=calendars.c.version,
         properties={
             "_appointments": relationship(
                 Appointment, cascade="all, delete-orphan"
             ),
+            "_recurring": relationship(
+                RecurringAppointment, cascade="all, delete-orphan"
+            ),
         },
     )
     mapper(Appointment, appointments)
+    mapper(RecurrenceException, recurrence_exceptions)
+    mapper(
+        RecurringAppointment,
+        recurring_appointments,
+        properties={
+            "_ex": relationship(
+                RecurrenceException, cascade="all, delete-orphan"
+            )
+        },
+    )
+    RecurringAppointment.exceptions = association_proxy("_ex", "since")
     mapper(
         User, users, polymorphic_on=users.c.type, polymorphic_identity="user"
     )
@@ -118,3 +233,10 @@ def start_mappers():
 @event.listens_for(Calendar, "load")
 def receive_load(c, _):
     c.events = []
+    c._reset_indexes()
+
+
+@event.listens_for(Calendar, "refresh")
+def receive_refresh(c, _, attrs):
+    # loaded again, possibly with the appointments of another window
+    c._reset_indexes()
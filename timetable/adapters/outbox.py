@@ -0,0 +1,109 @@
+"""JSON form of domain events stored in the outbox table.
+
+Events are plain classes or dataclasses; their attributes are stored by
+name, with datetimes as ISO strings and timedeltas as seconds, and turned
+back using the type hints of the event class. The class itself is looked
+up by its dotted path among known event types, never imported from
+whatever path a row names.
+"""
+
+from dataclasses import fields, is_dataclass
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+from timetable.domain.event import Event
+
+Payload = Dict[str, Any]
+
+
+def _type_name(cls: Type[Event]) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def event_type(event: Event) -> str:
+    return _type_name(type(event))
+
+
+def event_types(classes: Iterable[type]) -> Dict[str, Type[Event]]:
+    """Event classes by the name ``event_type`` stores them under."""
+    return {
+        _type_name(cls): cls
+        for cls in classes
+        if isinstance(cls, type) and issubclass(cls, Event)
+    }
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any, hint: Any) -> Any:
+    if value is None:
+        return None
+    origin = get_origin(hint)
+    if origin is Union:
+        # Optional[X] and the like, the first type that fits wins
+        for arg in get_args(hint):
+            if arg is type(None):
+                continue
+            try:
+                return _decode(value, arg)
+            except (TypeError, ValueError):
+                pass
+        return value
+    if origin in (list, tuple):
+        args = get_args(hint)
+        if origin is tuple and args and args[-1] is not Ellipsis:
+            return tuple(_decode(v, a) for v, a in zip(value, args))
+        item = args[0] if args else Any
+        return origin(_decode(v, item) for v in value)
+    if hint is datetime:
+        return datetime.fromisoformat(value)
+    if hint is timedelta:
+        return timedelta(seconds=value)
+    return value
+
+
+def serialize(event: Event) -> Payload:
+    if is_dataclass(event):
+        names: Iterable[str] = [f.name for f in fields(event)]
+    else:
+        names = list(vars(event))
+    return {name: _encode(getattr(event, name)) for name in names}
+
+
+def deserialize(
+    type_name: str, payload: Payload, types: Mapping[str, Type[Event]]
+) -> Event:
+    """Event of a row, its class looked up in ``types`` (see event_types)."""
+    cls = types.get(type_name)
+    if cls is None:
+        raise ValueError(f"{type_name} is not a known event type")
+    hints = get_type_hints(cls)
+    values = {k: _decode(v, hints.get(k, Any)) for k, v in payload.items()}
+    if is_dataclass(cls):
+        return cls(**values)
+    event = cls.__new__(cls)
+    vars(event).update(values)
+    return event
+
+
+def outbox_rows(events: Iterable[Event]) -> List[Payload]:
+    return [{"type": event_type(e), "payload": serialize(e)} for e in events]
@@ -0,0 +1,236 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from timetable.adapters.orm import (
+    appointments,
+    calendars,
+    recurrence_exceptions,
+    recurring_appointments,
+    tags,
+    users,
+)
+from timetable.domain.recurrence import occurrences
+
+# position of an appointment in listings, which are ordered by it
+Key = Tuple[datetime, int]
+Row = Dict[str, Any]
+Span = Tuple[datetime, datetime]
+
+# Non-owners only ever get since/until of accepted appointments.
+OWNER_COLUMNS = [
+    appointments.c.id,
+    appointments.c.from_user,
+    appointments.c.since,
+    appointments.c.until,
+    appointments.c.description,
+    appointments.c.accepted,
+]
+PUBLIC_COLUMNS = [appointments.c.since, appointments.c.until]
+
+
+class AbstractReadModel:
+    """Queries behind the views, answered with plain rows.
+
+    Unlike repositories, a read model never loads an aggregate, so views
+    pay only for the columns they serve.
+    """
+
+    def has_calendar(self, owner: str) -> bool:
+        raise NotImplementedError
+
+    def list_appointments(
+        self,
+        owner: str,
+        public: bool,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Row]:
+        """Appointments ordered by (since, id); only the accepted ones and
+        only their since/until if ``public``, and only those overlapping
+        [since, until) if a window is given."""
+        raise NotImplementedError
+
+    def list_appointments_page(
+        self, owner: str, public: bool, limit: int, after: Optional[Key]
+    ) -> List[Tuple[Key, Row]]:
+        """At most ``limit`` appointments ordered by (since, id), each with
+        its key, starting right after the key ``after`` (None to start from
+        the first one)."""
+        raise NotImplementedError
+
+    def get_appointment(self, owner: str, id: int) -> Optional[Row]:
+        raise NotImplementedError
+
+    def list_recurring(
+        self, owner: str, before: Optional[datetime] = None
+    ) -> List[Row]:
+        """Recurring appointments with the set of their cancelled starts
+        (``exceptions``), only those starting before ``before`` if given."""
+        raise NotImplementedError
+
+    def get_user(self, account_name: str) -> Optional[Row]:
+        """Account name, email and password, and tags of a service."""
+        raise NotImplementedError
+
+    def busy_spans(
+        self, owner: str, since: datetime, until: datetime
+    ) -> List[Iterable[Span]]:
+        """Spans taken within the window, in runs sorted by start: one of
+        the accepted appointments and one per recurring appointment."""
+        raise NotImplementedError
+
+
+class SqlReadModel(AbstractReadModel):
+    def __init__(self, session):
+        self.session = session
+
+    def has_calendar(self, owner: str) -> bool:
+        found = self.session.execute(
+            select([calendars.c.owner]).where(calendars.c.owner == owner)
+        ).scalar()
+        return found is not None
+
+    def _appointments_query(self, owner: str, public: bool):
+        a = appointments.c
+        if not public:
+            return select(OWNER_COLUMNS).where(a.calendar_owner == owner)
+        return select(PUBLIC_COLUMNS).where(
+            and_(a.calendar_owner == owner, a.accepted.is_(True))
+        )
+
+    def list_appointments(
+        self,
+        owner: str,
+        public: bool,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Row]:
+        a = appointments.c
+        query = self._appointments_query(owner, public)
+        if since is not None and until is not None:
+            query = query.where(and_(a.since < until, a.until > since))
+        rows = self.session.execute(query.order_by(a.since, a.id)).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_appointments_page(
+        self, owner: str, public: bool, limit: int, after: Optional[Key]
+    ) -> List[Tuple[Key, Row]]:
+        a = appointments.c
+        # the id is needed for the key even where it is not served
+        query = self._appointments_query(owner, public).add_columns(
+            a.id.label("key_id")
+        )
+        if after is not None:
+            since, id = after
+            query = query.where(
+                or_(a.since > since, and_(a.since == since, a.id > id))
+            )
+        rows = self.session.execute(
+            query.order_by(a.since, a.id).limit(limit)
+        ).fetchall()
+        page = []
+        for row in rows:
+            served = dict(row)
+            key = (served["since"], served.pop("key_id"))
+            page.append((key, served))
+        return page
+
+    def get_appointment(self, owner: str, id: int) -> Optional[Row]:
+        a = appointments.c
+        row = self.session.execute(
+            select(OWNER_COLUMNS).where(
+                and_(a.calendar_owner == owner, a.id == id)
+            )
+        ).first()
+        return None if row is None else dict(row)
+
+    def list_recurring(
+        self, owner: str, before: Optional[datetime] = None
+    ) -> List[Row]:
+        ra = recurring_appointments.c
+        re = recurrence_exceptions.c
+        query = select(
+            [
+                ra.id,
+                ra.from_user,
+                ra.since,
+                ra.until,
+                ra.description,
+                ra.every,
+                ra.repeat_until,
+            ]
+        ).where(ra.calendar_owner == owner)
+        if before is not None:
+            query = query.where(ra.since < before)
+        rules = {
+            row.id: dict(row, exceptions=set())
+            for row in self.session.execute(query.order_by(ra.id))
+        }
+        if rules:
+            for recurring_id, start in self.session.execute(
+                select([re.recurring_id, re.since]).where(
+                    re.calendar_owner == owner
+                )
+            ):
+                if recurring_id in rules:
+                    rules[recurring_id]["exceptions"].add(start)
+        return list(rules.values())
+
+    def get_user(self, account_name: str) -> Optional[Row]:
+        u = users.c
+        rows = self.session.execute(
+            select([u.account_name, u.email, u.password, u.type, tags.c.tag])
+            .select_from(
+                users.outerjoin(
+                    tags, tags.c.service_account_name == u.account_name
+                )
+            )
+            .where(u.account_name == account_name)
+            .order_by(tags.c.id)
+        ).fetchall()
+        if not rows:
+            return None
+        first = rows[0]
+        user = {
+            "account_name": first.account_name,
+            "email": first.email,
+            "password": first.password,
+        }
+        if first.type == "service":
+            user["tags"] = [row.tag for row in rows if row.tag is not None]
+        return user
+
+    def busy_spans(
+        self, owner: str, since: datetime, until: datetime
+    ) -> List[Iterable[Span]]:
+        a = appointments.c
+        accepted = self.session.execute(
+            select(PUBLIC_COLUMNS)
+            .where(
+                and_(
+                    a.calendar_owner == owner,
+                    a.accepted.is_(True),
+                    a.since < until,
+                    a.until > since,
+                )
+            )
+            .order_by(a.since)
+        ).fetchall()
+        spans: List[Iterable[Span]] = [
+            [(row.since, row.until) for row in accepted]
+        ]
+        for rule in self.list_recurring(owner, until):
+            spans.append(
+                occurrences(
+                    rule["since"],
+                    rule["until"],
+                    rule["every"],
+                    rule["repeat_until"],
+                    rule["exceptions"],
+                    since,
+                    until,
+                )
+            )
+        return spans
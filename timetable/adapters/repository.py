@@ -1,7 +1,32 @@
-from typing import List, Generic, TypeVar, Type
-
+from datetime import datetime
+from typing import (
+    Any,
+    Dict,
+    List,
+    Generic,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Type,
+)
+
+from sqlalchemy import and_, distinct, func, inspect
+from sqlalchemy.orm import contains_eager, selectinload, with_polymorphic
+from sqlalchemy.util import greenlet_spawn
+
+from timetable.adapters.orm import (
+    appointments,
+    calendars,
+    recurrence_exceptions,
+    recurring_appointments,
+    services,
+    tags as tags_table,
+)
 from timetable.domain.calendar import Calendar
-from timetable.domain.user import User, Service
+from timetable.domain.recurrence import occurrences
+from timetable.domain.user import User, Client, Service
 
 from timetable.domain.exceptions import DoesNotExistsError
 
@@ -22,48 +47,305 @@ class AbstractRepository(Generic[T]):
         raise NotImplementedError
 
 
+class CalendarRepository(AbstractRepository[Calendar]):
+    def get_window(
+        self, owner: str, since: datetime, until: datetime
+    ) -> Calendar:
+        """Calendar loaded with only appointments overlapping the window.
+
+        Enough for commands whose collisions are confined to the window.
+        """
+        raise NotImplementedError
+
+    def get_for_update(
+        self,
+        owner: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Calendar:
+        """Lock the calendar until commit, then load it.
+
+        Commands changing one calendar serialize on its lock while other
+        calendars stay writable. Given ``since`` and ``until`` only the
+        window is loaded, as with ``get_window``.
+        """
+        raise NotImplementedError
+
+    def get_appointment_span(
+        self, owner: str, id: int
+    ) -> Tuple[datetime, datetime]:
+        raise NotImplementedError
+
+
 class UserRepository(AbstractRepository[User]):
     def list_services(self) -> List[Service]:
         raise NotImplementedError
 
+    def search_by_tags(
+        self,
+        tags: List[str],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Tuple[str, List[str]]]:
+        """Account names and tags of services having all given tags and,
+        if a window is given, nothing booked in [since, until)."""
+        raise NotImplementedError
+
 
 class SqlRepository(AbstractRepository, Generic[T]):
-    model: T
+    """Repository over a mapped ``model``.
 
-    def __init__(self, session):
+    Subclasses may list subclasses of ``model`` in ``polymorphic`` to load
+    their tables in the same query, and ``loader_options`` are applied to
+    every query; both can be overridden per instance.
+    """
+
+    model: T
+    polymorphic: Sequence[type] = ()
+
+    def __init__(
+        self,
+        session,
+        polymorphic: Optional[Sequence[type]] = None,
+        loader_options: Optional[Sequence[Any]] = None,
+    ):
         self.session = session
+        if polymorphic is not None:
+            self.polymorphic = polymorphic
+        self.loader_options = loader_options
+        self._entity = None
+
+    @property
+    def entity(self):
+        # built on first use, mappers may not be configured before
+        if self._entity is None:
+            if self.polymorphic:
+                self._entity = with_polymorphic(
+                    self.model, list(self.polymorphic)
+                )
+            else:
+                self._entity = self.model
+        return self._entity
+
+    def default_loader_options(self) -> List[Any]:
+        return []
+
+    def query(self):
+        if self.loader_options is None:
+            self.loader_options = self.default_loader_options()
+        return self.session.query(self.entity).options(*self.loader_options)
 
     def get(self, id: str) -> T:
-        t = self.session.query(self.model).get(id)
+        if self.entity is self.model:
+            t = self.query().get(id)
+        else:
+            # Query.get() only accepts a plain mapped class
+            [key] = inspect(self.model).primary_key
+            t = self.query().filter(key == id).one_or_none()
         if t is None:
             raise DoesNotExistsError(f"{self.model} with {id} does not exist")
         return t
 
     def list(self) -> List[T]:
-        all_ = self.session.query(self.model).all()
+        all_ = self.query().all()
         return all_
 
     def add(self, t: T) -> None:
         self.session.add(t)
 
 
-class SqlCalendarRepository(SqlRepository):
+class SqlCalendarRepository(SqlRepository, CalendarRepository):
+    """Calendars, loaded whole or with the appointments of a window only.
+
+    A calendar already in the session may hold the appointments of another
+    window, so every query loads it again instead of returning it as is.
+    """
+
     model = Calendar
 
+    def query(self):
+        return super().query().populate_existing()
+
+    def get_window(
+        self, owner: str, since: datetime, until: datetime
+    ) -> Calendar:
+        c = (
+            self.session.query(Calendar)
+            .outerjoin(
+                appointments,
+                and_(
+                    appointments.c.calendar_owner == calendars.c.owner,
+                    appointments.c.since < until,
+                    appointments.c.until > since,
+                ),
+            )
+            .options(contains_eager("_appointments"))
+            .populate_existing()
+            .filter(calendars.c.owner == owner)
+            .one_or_none()
+        )
+        if c is None:
+            raise DoesNotExistsError(f"{Calendar} with {owner} does not exist")
+        return c
+
+    def get_for_update(
+        self,
+        owner: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Calendar:
+        # the lock is taken by a statement of its own, so appointments are
+        # read afterwards and include whatever the previous holder committed
+        locked = (
+            self.session.query(calendars.c.owner)
+            .filter(calendars.c.owner == owner)
+            .with_for_update()
+            .scalar()
+        )
+        if locked is None:
+            raise DoesNotExistsError(f"{Calendar} with {owner} does not exist")
+        if since is None or until is None:
+            return self.get(owner)
+        return self.get_window(owner, since, until)
+
+    def get_appointment_span(
+        self, owner: str, id: int
+    ) -> Tuple[datetime, datetime]:
+        span = (
+            self.session.query(appointments.c.since, appointments.c.until)
+            .filter(
+                appointments.c.calendar_owner == owner,
+                appointments.c.id == id,
+            )
+            .one_or_none()
+        )
+        if span is None:
+            raise DoesNotExistsError("such appointment does not exists")
+        return span.since, span.until
+
 
 class SqlUserRepository(SqlRepository, UserRepository):
     model = User
+    polymorphic = (Client, Service)
+
+    def default_loader_options(self) -> List[Any]:
+        if Service not in self.polymorphic:
+            return []
+        return [selectinload(self.entity.Service._tg)]
 
     def list_services(self) -> List[Service]:
-        all_ = self.session.query(Service).all()
+        all_ = (
+            self.session.query(Service)
+            .options(selectinload(Service._tg))
+            .all()
+        )
         return all_
 
+    def search_by_tags(
+        self,
+        tags: List[str],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Tuple[str, List[str]]]:
+        t = tags_table.c
+        wanted = set(tags)
+        if wanted:
+            account = t.service_account_name
+            matching = (
+                self.session.query(account)
+                .filter(t.tag.in_(wanted))
+                .group_by(account)
+                .having(func.count(distinct(t.tag)) == len(wanted))
+            )
+        else:
+            account = services.c.account_name
+            matching = self.session.query(account)
+        taken: Set[str] = set()
+        if since is not None and until is not None:
+            a = appointments.c
+            busy = (
+                self.session.query(a.id)
+                .filter(
+                    a.calendar_owner == account,
+                    a.accepted.is_(True),
+                    a.since < until,
+                    a.until > since,
+                )
+                .exists()
+            )
+            matching = matching.filter(~busy)
+            taken = self._taken_by_occurrences(matching, since, until)
+        rows = (
+            self.session.query(services.c.account_name, t.tag)
+            .outerjoin(
+                tags_table, t.service_account_name == services.c.account_name
+            )
+            .filter(services.c.account_name.in_(matching.statement))
+            .order_by(t.id)
+        )
+        if taken:
+            rows = rows.filter(services.c.account_name.notin_(taken))
+        found: Dict[str, List[str]] = {}
+        for account_name, tag in rows:
+            service_tags = found.setdefault(account_name, [])
+            if tag is not None:
+                service_tags.append(tag)
+        return list(found.items())
+
+    def _taken_by_occurrences(
+        self, matching, since: datetime, until: datetime
+    ) -> Set[str]:
+        # recurring series are not expanded in SQL; only the rule rows of
+        # matching services are read and the few occurrences reaching the
+        # window are computed here
+        ra = recurring_appointments.c
+        rules = self.session.query(
+            ra.calendar_owner,
+            ra.id,
+            ra.since,
+            ra.until,
+            ra.every,
+            ra.repeat_until,
+        ).filter(ra.calendar_owner.in_(matching.statement), ra.since < until)
+        hits = {}
+        for owner, id, first_since, first_until, every, repeat_until in rules:
+            starts = [
+                s
+                for s, _ in occurrences(
+                    first_since,
+                    first_until,
+                    every,
+                    repeat_until,
+                    (),
+                    since,
+                    until,
+                )
+            ]
+            if starts:
+                hits[(owner, id)] = starts
+        if not hits:
+            return set()
+        re = recurrence_exceptions.c
+        cancelled = set(
+            self.session.query(re.calendar_owner, re.recurring_id, re.since)
+            .filter(
+                re.calendar_owner.in_({owner for owner, _ in hits}),
+                re.since.in_({s for starts in hits.values() for s in starts}),
+            )
+            .all()
+        )
+        return {
+            owner
+            for (owner, id), starts in hits.items()
+            if any((owner, id, s) not in cancelled for s in starts)
+        }
+
 
 class TrackingRepository(Generic[T]):
     repo_class: Type[AbstractRepository[T]]
 
-    def __init__(self, *args):
-        self.repo = self.repo_class(*args)
+    def __init__(self, *args, **kwargs):
+        self.repo = self.repo_class(*args, **kwargs)
         self.seen = set()
 
     def get(self, id: str) -> T:
@@ -84,6 +366,28 @@ class TrackingRepository(Generic[T]):
 class SqlTrackingCalendarRepository(TrackingRepository):
     repo_class = SqlCalendarRepository
 
+    def get_window(
+        self, owner: str, since: datetime, until: datetime
+    ) -> Calendar:
+        c = self.repo.get_window(owner, since, until)
+        self.seen.add(c)
+        return c
+
+    def get_for_update(
+        self,
+        owner: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Calendar:
+        c = self.repo.get_for_update(owner, since, until)
+        self.seen.add(c)
+        return c
+
+    def get_appointment_span(
+        self, owner: str, id: int
+    ) -> Tuple[datetime, datetime]:
+        return self.repo.get_appointment_span(owner, id)
+
 
 class SqlTrackingUserRepository(TrackingRepository):
     repo_class = SqlUserRepository
@@ -92,3 +396,89 @@ class SqlTrackingUserRepository(TrackingRepository):
         all_ = self.repo.list_services()
         self.seen.update(all_)
         return all_
+
+    def search_by_tags(
+        self,
+        tags: List[str],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Tuple[str, List[str]]]:
+        return self.repo.search_by_tags(tags, since, until)
+
+
+class AsyncRepository(Generic[T]):
+    """Asyncio counterpart of a repository, wrapping a synchronous one.
+
+    The wrapped repository works on the synchronous side of an AsyncSession
+    (``AsyncSession.sync_session``) and runs in a greenlet awaiting its IO.
+    Whole aggregates are loaded there, since lazy loads cannot happen once
+    control is back in asyncio code.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    @property
+    def seen(self) -> Set[T]:
+        """Aggregates seen by the wrapped TrackingRepository."""
+        return self.repo.seen
+
+    async def _run(self, method: str, *args):
+        def run():
+            return self._loaded(getattr(self.repo, method)(*args))
+
+        return await greenlet_spawn(run)
+
+    def _loaded(self, result):
+        return result
+
+    async def get(self, id: str) -> T:
+        return await self._run("get", id)
+
+    async def list(self) -> List[T]:
+        return await self._run("list")
+
+    def add(self, t: T) -> None:
+        self.repo.add(t)
+
+
+class AsyncSqlCalendarRepository(AsyncRepository):
+    def _loaded(self, result):
+        loaded = result if isinstance(result, list) else [result]
+        for c in loaded:
+            if isinstance(c, Calendar):
+                c.list_appointments()
+                for r in c.list_recurring_appointments():
+                    r.exceptions
+        return result
+
+    async def get_window(
+        self, owner: str, since: datetime, until: datetime
+    ) -> Calendar:
+        return await self._run("get_window", owner, since, until)
+
+    async def get_for_update(
+        self,
+        owner: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Calendar:
+        return await self._run("get_for_update", owner, since, until)
+
+    async def get_appointment_span(
+        self, owner: str, id: int
+    ) -> Tuple[datetime, datetime]:
+        return await self._run("get_appointment_span", owner, id)
+
+
+class AsyncSqlUserRepository(AsyncRepository):
+    async def list_services(self) -> List[Service]:
+        return await self._run("list_services")
+
+    async def search_by_tags(
+        self,
+        tags: List[str],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Tuple[str, List[str]]]:
+        return await self._run("search_by_tags", tags, since, until)
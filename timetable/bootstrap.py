@@ -1,9 +1,12 @@
 import inspect
-from functools import partial
+from functools import partial, wraps
 
 from timetable.adapters.orm import start_mappers
-from timetable.service_layer.message_bus import MessageBus
-from timetable.service_layer.unit_of_work import AbstractUnitOfWork
+from timetable.service_layer.message_bus import AsyncMessageBus, MessageBus
+from timetable.service_layer.unit_of_work import (
+    AbstractUnitOfWork,
+    AsyncSqlUnitOfWork,
+)
 
 from timetable.service_layer.handlers import EVENT_HANDLERS, COMMAND_HANDLERS
 
@@ -15,8 +18,8 @@ def bootstrap(start_orm: bool, uow: AbstractUnitOfWork) -> MessageBus:
     dependencies = {"uow": uow}
 
     events_handlers = {
-        event: inject_dependencies(handler, dependencies)
-        for event, handler in EVENT_HANDLERS.items()
+        event: [inject_dependencies(h, dependencies) for h in handlers]
+        for event, handlers in EVENT_HANDLERS.items()
     }
     command_handlers = {
         event: inject_dependencies(handler, dependencies)
@@ -27,6 +30,29 @@ def bootstrap(start_orm: bool, uow: AbstractUnitOfWork) -> MessageBus:
     return mb
 
 
+def bootstrap_async(
+    start_orm: bool, uow: AsyncSqlUnitOfWork
+) -> AsyncMessageBus:
+    if start_orm:
+        start_mappers()
+
+    def inject(handler):
+        # plain handlers run in greenlets, see AsyncMessageBus
+        uow_ = uow if inspect.iscoroutinefunction(handler) else uow.sync
+        return inject_dependencies(handler, {"uow": uow_})
+
+    events_handlers = {
+        event: [inject(h) for h in handlers]
+        for event, handlers in EVENT_HANDLERS.items()
+    }
+    command_handlers = {
+        command: inject(handler)
+        for command, handler in COMMAND_HANDLERS.items()
+    }
+
+    return AsyncMessageBus(events_handlers, command_handlers, uow)
+
+
 def inject_dependencies(target, dependencies):
     params = inspect.signature(target).parameters
     deps = {
@@ -34,4 +60,12 @@ def inject_dependencies(target, dependencies):
         for name, dependency in dependencies.items()
         if name in params
     }
+    if inspect.iscoroutinefunction(target):
+        # a partial would hide that calling it returns a coroutine
+
+        @wraps(target)
+        async def injected(message):
+            return await target(message, **deps)
+
+        return injected
     return partial(target, **deps)
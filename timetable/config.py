@@ -10,5 +10,24 @@ def get_database_uri():
     return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
 
 
+def get_async_database_uri():
+    return get_database_uri().replace("+psycopg2", "+asyncpg", 1)
+
+
+def get_command_lanes():
+    """Worker lanes handling commands, one per CPU unless configured."""
+    lanes = os.environ.get("COMMAND_LANES")
+    return int(lanes) if lanes else os.cpu_count()
+
+
 def get_secret_key():
     return os.urandom(16)
+
+
+def get_exclusion_constraint():
+    """Whether PostgreSQL should reject overlapping accepted appointments."""
+    return os.environ.get("PG_EXCLUSION_CONSTRAINT", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
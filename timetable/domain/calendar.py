@@ -1,17 +1,55 @@
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from heapq import merge
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from timetable.domain.appointment import Appointment
+from timetable.domain.columns import AppointmentColumns
 from timetable.domain.exceptions import DoesNotExistsError, NotAvailableError
 from timetable.domain.event import Event
+from timetable.domain.interval import DisjointIntervalIndex, IntervalIndex
+from timetable.domain.recurrence import RecurringAppointment
 
 
 class Calendar:
     def __init__(self, owner: str):
         self.id_count = 0
         self._appointments: List[Appointment] = []
+        self._recurring: List[RecurringAppointment] = []
         self.owner = owner
         self.events: List[Event] = []
+        self._reset_indexes()
+
+    def _reset_indexes(self) -> None:
+        # built lazily, so a calendar loaded from the database pays for the
+        # indexes only when a command actually checks for collisions
+        self._indexes: Optional[
+            Tuple[DisjointIntervalIndex, IntervalIndex]
+        ] = None
+        self._by_id: Optional[Dict[int, Appointment]] = None
+        self._columns: Optional[AppointmentColumns] = None
+
+    def _get_indexes(self) -> Tuple[DisjointIntervalIndex, IntervalIndex]:
+        """Return indexes of accepted and pending appointments."""
+        if self._indexes is None:
+            accepted = DisjointIntervalIndex(
+                a for a in self._appointments if a.accepted
+            )
+            pending = IntervalIndex(
+                a for a in self._appointments if not a.accepted
+            )
+            self._indexes = (accepted, pending)
+        return self._indexes
+
+    def _get_by_id(self) -> Dict[int, Appointment]:
+        if self._by_id is None:
+            self._by_id = {a.id: a for a in self._appointments}
+        return self._by_id
+
+    def columns(self) -> AppointmentColumns:
+        """Return a compact, array-backed snapshot of the appointments."""
+        if self._columns is None:
+            self._columns = AppointmentColumns(self._appointments)
+        return self._columns
 
     def create_appointment(
         self,
@@ -28,48 +66,156 @@ class Calendar:
             description=description,
             accepted=False,
         )
-        for a2 in self._appointments:
-            if a2.collide(a) and a2.accepted:
-                raise NotAvailableError("Time reserved already")
+        _, pending = self._get_indexes()
+        if not self.is_available(a.since, a.until):
+            raise NotAvailableError("Time reserved already")
         self._appointments.append(a)
+        pending.add(a)
+        if self._by_id is not None:
+            self._by_id[a.id] = a
+        self._columns = None
         self.id_count += 1
         return a
 
+    def create_appointments(
+        self, candidates: Iterable[Tuple[str, datetime, datetime, str]]
+    ) -> List[Optional[Appointment]]:
+        """Create a batch of appointment requests in one pass.
+
+        Candidates are (from_user, since, until, description) tuples, checked
+        against accepted appointments all at once. The result holds the
+        created appointment for each candidate, or None where it collides
+        with an accepted one.
+        """
+        apps = [
+            Appointment(
+                id=None,
+                from_user=from_user,
+                since=since,
+                until=until,
+                description=description,
+                accepted=False,
+            )
+            for from_user, since, until, description in candidates
+        ]
+        free = self.columns().free_mask(
+            [a.since for a in apps], [a.until for a in apps]
+        )
+        _, pending = self._get_indexes()
+        created: List[Optional[Appointment]] = []
+        for a, is_free in zip(apps, free):
+            if not is_free or self._collides_with_recurring(a.since, a.until):
+                created.append(None)
+                continue
+            a.id = self.id_count
+            self.id_count += 1
+            self._appointments.append(a)
+            pending.add(a)
+            if self._by_id is not None:
+                self._by_id[a.id] = a
+            created.append(a)
+        self._columns = None
+        return created
+
     def accept_appointment(self, a: Appointment) -> Appointment:
-        # list of valid appointments after this app is accepted
-        updated_list: List[Appointment] = []
-        # flag if current app is owned by calendar
-        owned = False
-        # flag if a collision with currently accepted exists
-        collision_exists = False
-        for i, a2 in enumerate(self._appointments):
-            collision_exists |= self._resolve_collision(a, a2, updated_list)
-            if a2 == a:
-                owned = True
-        if not owned:
+        accepted, pending = self._get_indexes()
+        if a in accepted:
+            return a
+        if a not in pending:
             raise DoesNotExistsError(
                 "This element does not belong to this calendar"
             )
-        if collision_exists:
+        if not self.is_available(a.since, a.until):
             raise NotAvailableError("Time reserved already")
-        else:
-            self._appointments = updated_list
-            a.accepted = True
+        for a2 in list(pending.overlapping(a.since, a.until, exclude=a)):
+            self._reject(a2)
+        pending.remove(a)
+        accepted.add(a)
+        a.accepted = True
+        self._columns = None
         return a
 
-    def _resolve_collision(
+    def _reject(self, a: Appointment) -> None:
+        # remove only the rejected request, so the ORM has to flush just
+        # this one instead of diffing the whole collection
+        _, pending = self._get_indexes()
+        pending.remove(a)
+        self._appointments.remove(a)
+        if self._by_id is not None:
+            del self._by_id[a.id]
+        self._columns = None
+
+    def add_recurring_appointment(
         self,
-        a1: Appointment,
-        a2: Appointment,
-        verified_list: List[Appointment],
+        from_user: str,
+        since: datetime,
+        until: datetime,
+        description: str,
+        every: timedelta,
+        repeat_until: Optional[datetime] = None,
+    ) -> RecurringAppointment:
+        """Book a standing appointment, rejecting requests it overlaps."""
+        r = RecurringAppointment(
+            id=self.id_count,
+            from_user=from_user,
+            since=since,
+            until=until,
+            description=description,
+            every=every,
+            repeat_until=repeat_until,
+        )
+        end = r.end or datetime.max
+        accepted, pending = self._get_indexes()
+        if any(
+            r.collides_with(a.since, a.until)
+            for a in accepted.overlapping(r.since, end)
+        ) or any(r.collides_with_rule(r2) for r2 in self._recurring):
+            raise NotAvailableError("Time reserved already")
+        for a in list(pending.overlapping(r.since, end)):
+            if r.collides_with(a.since, a.until):
+                self._reject(a)
+        self._recurring.append(r)
+        self.id_count += 1
+        return r
+
+    def cancel_occurrence(self, id: int, since: datetime) -> None:
+        r = self.get_recurring_appointment(id)
+        if not r.is_occurrence(since):
+            raise DoesNotExistsError("such occurrence does not exists")
+        if since not in r.exceptions:
+            r.exceptions.append(since)
+
+    def _collides_with_recurring(
+        self, since: datetime, until: datetime
     ) -> bool:
-        rv = False
-        if a2.collide(a1):
-            if a2.accepted:
-                rv = True
-        else:
-            verified_list.append(a2)
-        return rv
+        return any(r.collides_with(since, until) for r in self._recurring)
+
+    def is_available(self, since: datetime, until: datetime) -> bool:
+        accepted, _ = self._get_indexes()
+        if next(accepted.overlapping(since, until), None) is not None:
+            return False
+        return not self._collides_with_recurring(since, until)
+
+    def free_slots(
+        self,
+        window_start: datetime,
+        window_end: datetime,
+        min_duration: timedelta = timedelta(),
+    ) -> List[Tuple[datetime, datetime]]:
+        """Return gaps between accepted appointments within the window."""
+        check_window(window_start, window_end)
+        accepted, _ = self._get_indexes()
+        busy = merge(
+            (
+                (a.since, a.until)
+                for a in accepted.overlapping(window_start, window_end)
+            ),
+            *(
+                r.occurrences(window_start, window_end)
+                for r in self._recurring
+            ),
+        )
+        return free_gaps(busy, window_start, window_end, min_duration)
 
     def __repr__(self) -> str:
         return f"Calendar({self.owner})"
@@ -80,7 +226,42 @@ class Calendar:
         return self._appointments
 
     def get_appointment(self, id: int) -> Appointment:
-        app = next((a for a in self._appointments if a.id == id), None)
+        app = self._get_by_id().get(id)
         if app is None:
             raise DoesNotExistsError("such appointment does not exists")
         return app
+
+    def list_recurring_appointments(self) -> List[RecurringAppointment]:
+        return self._recurring
+
+    def get_recurring_appointment(self, id: int) -> RecurringAppointment:
+        r = next((r for r in self._recurring if r.id == id), None)
+        if r is None:
+            raise DoesNotExistsError("such appointment does not exists")
+        return r
+
+
+def check_window(window_start: datetime, window_end: datetime) -> None:
+    if window_end <= window_start:
+        raise ValueError(
+            "window cannot end before it starts"
+            f" ({window_start} >= {window_end})"
+        )
+
+
+def free_gaps(
+    busy: Iterable[Tuple[datetime, datetime]],
+    window_start: datetime,
+    window_end: datetime,
+    min_duration: timedelta,
+) -> List[Tuple[datetime, datetime]]:
+    """Sweep busy intervals sorted by start and collect the free ones."""
+    gaps = []
+    cursor = window_start
+    for since, until in busy:
+        if since > cursor and since - cursor >= min_duration:
+            gaps.append((cursor, since))
+        cursor = max(cursor, until)
+    if window_end > cursor and window_end - cursor >= min_duration:
+        gaps.append((cursor, window_end))
+    return gaps
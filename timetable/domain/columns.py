@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from timetable.domain.appointment import Appointment
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch(dt: datetime) -> int:
+    """Microseconds between EPOCH and a naive datetime."""
+    return (dt - EPOCH) // MICROSECOND
+
+
+def from_epoch(us: int) -> datetime:
+    return EPOCH + int(us) * MICROSECOND
+
+
+class AppointmentColumns:
+    """Read-only columnar copy of a set of appointments.
+
+    Rows are sorted by ``since`` and stored as int64 arrays of epoch
+    microseconds, which is far more compact than the mapped objects and
+    lets range checks run vectorized.
+    """
+
+    __slots__ = ("ids", "since", "until", "accepted")
+
+    def __init__(self, appointments: Iterable[Appointment]):
+        rows = sorted(
+            (a.since, a.id, a.until, a.accepted) for a in appointments
+        )
+        n = len(rows)
+        self.ids = np.fromiter((r[1] for r in rows), np.int64, n)
+        self.since = np.fromiter((to_epoch(r[0]) for r in rows), np.int64, n)
+        self.until = np.fromiter((to_epoch(r[2]) for r in rows), np.int64, n)
+        self.accepted = np.fromiter((r[3] for r in rows), np.bool_, n)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def overlapping(self, since: datetime, until: datetime) -> np.ndarray:
+        """Return a boolean mask of rows overlapping [since, until)."""
+        return (self.since < to_epoch(until)) & (self.until > to_epoch(since))
+
+    def is_free(self, since: datetime, until: datetime) -> bool:
+        return not (self.overlapping(since, until) & self.accepted).any()
+
+    def free_mask(
+        self, since: Sequence[datetime], until: Sequence[datetime]
+    ) -> np.ndarray:
+        """Tell for each [since, until) pair if it avoids accepted rows.
+
+        Accepted rows never overlap, so sorted by ``since`` they are sorted
+        by ``until`` as well; one ``searchsorted`` finds, for every pair,
+        the only accepted row that could collide with it.
+        """
+        acc_since = self.since[self.accepted]
+        acc_until = self.until[self.accepted]
+        starts = np.fromiter(map(to_epoch, since), np.int64, len(since))
+        ends = np.fromiter(map(to_epoch, until), np.int64, len(until))
+        i = np.searchsorted(acc_until, starts, side="right")
+        found = i < len(acc_until)
+        blocked = np.zeros(len(starts), np.bool_)
+        blocked[found] = acc_since[i[found]] < ends[found]
+        return ~blocked
+
+    def accepted_intervals(self) -> List[Tuple[datetime, datetime]]:
+        return [
+            (from_epoch(s), from_epoch(u))
+            for s, u in zip(
+                self.since[self.accepted], self.until[self.accepted]
+            )
+        ]
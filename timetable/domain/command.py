@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Tuple
 
 
 class Command:
@@ -16,12 +16,37 @@ class CreateAppointment(Command):
     description: str
 
 
+@dataclass
+class CreateAppointments(Command):
+    to_user: str
+    # (from_user, since, until, description) of every requested appointment
+    appointments: List[Tuple[str, datetime, datetime, str]]
+
+
 @dataclass
 class AcceptAppointment(Command):
     account_name: str
     id: int
 
 
+@dataclass
+class CreateRecurringAppointment(Command):
+    account_name: str
+    from_user: str
+    since: datetime
+    until: datetime
+    description: str
+    every: timedelta
+    repeat_until: Optional[datetime] = None
+
+
+@dataclass
+class CancelOccurrence(Command):
+    account_name: str
+    id: int
+    since: datetime
+
+
 @dataclass
 class CreateClient(Command):
     account_name: str
@@ -4,3 +4,7 @@ class NotAvailableError(BaseException):
 
 class DoesNotExistsError(BaseException):
     """No such entry"""
+
+
+class ConcurrencyError(BaseException):
+    """Entry was changed by someone else in the meantime"""
@@ -0,0 +1,237 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from timetable.domain.appointment import Appointment
+
+Key = Tuple[datetime, int]
+
+# entries per block; a block is split once it holds twice as many
+_LOAD = 512
+
+
+def _key(a: Appointment) -> Key:
+    return (a.since, a.id)
+
+
+class _SortedAppointments:
+    """Appointments ordered by (since, id) in a list of sorted blocks.
+
+    Adding or removing an appointment shifts only the entries of its own
+    block, and a position is found by bisecting the last keys of the
+    blocks first, so both take O(log n + _LOAD).
+    """
+
+    def __init__(self, appointments: Iterable[Appointment] = ()):
+        entries = sorted(appointments, key=_key)
+        rest = iter(entries)
+        self._blocks: List[List[Appointment]] = list(
+            iter(lambda: list(islice(rest, _LOAD)), [])
+        )
+        self._keys: List[List[Key]] = [
+            [_key(a) for a in block] for block in self._blocks
+        ]
+        self._maxes: List[Key] = [keys[-1] for keys in self._keys]
+        self._len = len(entries)
+        self._rebuilt()
+
+    def _rebuilt(self) -> None:
+        """Called once the blocks were built, split or dropped."""
+
+    def _changed(self, b: int) -> None:
+        """Called once the entries of block ``b`` changed."""
+
+    def _locate(self, key: Key) -> Tuple[int, int]:
+        """Block and offset of the first entry not below ``key``."""
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            return b, 0
+        return b, bisect_left(self._keys[b], key)
+
+    def add(self, a: Appointment) -> None:
+        key = _key(a)
+        if not self._blocks:
+            self._blocks.append([a])
+            self._keys.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuilt()
+            return
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            b -= 1
+        keys = self._keys[b]
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        self._blocks[b].insert(i, a)
+        self._maxes[b] = keys[-1]
+        self._len += 1
+        if len(keys) > 2 * _LOAD:
+            block = self._blocks[b]
+            self._blocks[b] = block[:_LOAD]
+            self._blocks.insert(b + 1, block[_LOAD:])
+            self._keys[b] = keys[:_LOAD]
+            self._keys.insert(b + 1, keys[_LOAD:])
+            self._maxes[b] = keys[_LOAD - 1]
+            self._maxes.insert(b + 1, keys[-1])
+            self._rebuilt()
+        else:
+            self._changed(b)
+
+    def remove(self, a: Appointment) -> None:
+        position = self._position(a)
+        if position is None:
+            raise ValueError(f"{a} is not indexed")
+        b, i = position
+        del self._blocks[b][i]
+        del self._keys[b][i]
+        self._len -= 1
+        if self._keys[b]:
+            self._maxes[b] = self._keys[b][-1]
+            self._changed(b)
+        else:
+            del self._blocks[b]
+            del self._keys[b]
+            del self._maxes[b]
+            self._rebuilt()
+
+    def _position(self, a: Appointment) -> Optional[Tuple[int, int]]:
+        key = _key(a)
+        b, i = self._locate(key)
+        while b < len(self._blocks):
+            keys = self._keys[b]
+            while i < len(keys) and keys[i] == key:
+                if self._blocks[b][i] is a:
+                    return b, i
+                i += 1
+            if i < len(keys):
+                return None
+            b, i = b + 1, 0
+        return None
+
+    def _from(self, b: int, i: int) -> Iterator[Appointment]:
+        """Entries from offset ``i`` of block ``b`` onwards."""
+        if b < len(self._blocks):
+            yield from self._blocks[b][i:]
+        for block in islice(self._blocks, b + 1, None):
+            yield from block
+
+    def __contains__(self, a: object) -> bool:
+        return isinstance(a, Appointment) and self._position(a) is not None
+
+    def __iter__(self) -> Iterator[Appointment]:
+        return self._from(0, 0)
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class IntervalIndex(_SortedAppointments):
+    """Appointments ordered by start time, answering overlap queries.
+
+    Every block remembers the latest end among its entries, and a max tree
+    over those ends finds the blocks that reach into a queried interval in
+    O(log n) each. A long appointment is thus visited only by the queries
+    that actually overlap it.
+    """
+
+    def _rebuilt(self) -> None:
+        self._ends = _MaxTree(
+            [max(a.until for a in block) for block in self._blocks]
+        )
+
+    def _changed(self, b: int) -> None:
+        self._ends.update(b, max(a.until for a in self._blocks[b]))
+
+    def overlapping(
+        self,
+        since: datetime,
+        until: datetime,
+        exclude: Optional[Appointment] = None,
+    ) -> Iterator[Appointment]:
+        # blocks past the one holding the first key from ``until`` on
+        # start too late to overlap
+        stop = min(bisect_left(self._maxes, (until,)) + 1, len(self._blocks))
+        for b in self._ends.above(stop, since):
+            for a in self._blocks[b]:
+                if a.since >= until:
+                    break
+                if a.until > since and a is not exclude:
+                    yield a
+
+
+class DisjointIntervalIndex(_SortedAppointments):
+    """Appointments which never overlap, answering overlap queries.
+
+    Ordered by start time, such appointments are ordered by end time too,
+    so of those starting before a queried interval only the last one can
+    reach into it.
+    """
+
+    def overlapping(
+        self,
+        since: datetime,
+        until: datetime,
+        exclude: Optional[Appointment] = None,
+    ) -> Iterator[Appointment]:
+        b, i = self._locate((since,))
+        before = self._before(b, i)
+        if before is not None and before.until > since:
+            if before is not exclude:
+                yield before
+        for a in self._from(b, i):
+            if a.since >= until:
+                break
+            if a is not exclude:
+                yield a
+
+    def _before(self, b: int, i: int) -> Optional[Appointment]:
+        if i > 0:
+            return self._blocks[b][i - 1]
+        if b > 0:
+            return self._blocks[b - 1][-1]
+        return None
+
+
+class _MaxTree:
+    """Maxima of a list of datetimes, kept in a binary heap layout."""
+
+    def __init__(self, values: List[datetime]):
+        size = 1
+        while size < len(values):
+            size *= 2
+        self._size = size
+        padding = [datetime.min] * (size - len(values))
+        self._tree = [datetime.min] * size + values + padding
+        for node in range(size - 1, 0, -1):
+            self._tree[node] = max(
+                self._tree[2 * node], self._tree[2 * node + 1]
+            )
+
+    def update(self, i: int, value: datetime) -> None:
+        node = self._size + i
+        self._tree[node] = value
+        node //= 2
+        while node:
+            self._tree[node] = max(
+                self._tree[2 * node], self._tree[2 * node + 1]
+            )
+            node //= 2
+
+    def above(self, stop: int, bound: datetime) -> Iterator[int]:
+        """Positions below ``stop`` holding a value after ``bound``, in
+        ascending order."""
+        tree = self._tree
+        # nodes to visit with the first position they cover and their width
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, first, width = stack.pop()
+            if first >= stop or tree[node] <= bound:
+                continue
+            if width == 1:
+                yield first
+                continue
+            width //= 2
+            stack.append((2 * node + 1, first + width, width))
+            stack.append((2 * node, first, width))
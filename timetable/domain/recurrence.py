@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+from math import gcd
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+def occurrence_range(
+    first_since: datetime,
+    first_until: datetime,
+    every: timedelta,
+    repeat_until: Optional[datetime],
+    since: datetime,
+    until: datetime,
+) -> range:
+    """Numbers of the occurrences overlapping [since, until).
+
+    Occurrence ``k`` spans [first_since + k * every, first_until + k * every)
+    and only occurrences starting before ``repeat_until`` exist, so the
+    bounds follow from arithmetic instead of walking the series.
+    """
+    duration = first_until - first_since
+    lo = max(0, (since - first_since - duration) // every + 1)
+    hi = -((first_since - until) // every)
+    if repeat_until is not None:
+        hi = min(hi, -((first_since - repeat_until) // every))
+    return range(lo, max(lo, hi))
+
+
+def occurrences(
+    first_since: datetime,
+    first_until: datetime,
+    every: timedelta,
+    repeat_until: Optional[datetime],
+    exceptions: Collection[datetime],
+    since: datetime,
+    until: datetime,
+) -> Iterator[Tuple[datetime, datetime]]:
+    for k in occurrence_range(
+        first_since, first_until, every, repeat_until, since, until
+    ):
+        start = first_since + k * every
+        if start not in exceptions:
+            yield start, first_until + k * every
+
+
+class RecurringAppointment:
+    """Standing booking repeated ``every`` since its first occurrence.
+
+    Occurrences are never stored; they are expanded on demand within the
+    window a caller asks about, skipping cancelled ones (``exceptions``).
+    """
+
+    def __init__(
+        self,
+        id: Optional[int],
+        from_user: str,
+        since: datetime,
+        until: datetime,
+        description: str,
+        every: timedelta,
+        repeat_until: Optional[datetime] = None,
+    ):
+        if (until - since) <= timedelta():
+            raise ValueError(
+                f"since cannot be after until ({since} > {until})"
+            )
+        if every < until - since:
+            raise ValueError(
+                "occurrences cannot overlap each other"
+                f" ({every} < {until - since})"
+            )
+        if repeat_until is not None and repeat_until <= since:
+            raise ValueError(
+                f"repeat_until must be after since ({repeat_until} <= {since})"
+            )
+        self.id = id
+        self.from_user = from_user
+        self.since = since
+        self.until = until
+        self.description = description
+        self.every = every
+        self.repeat_until = repeat_until
+        # starts of cancelled occurrences
+        self.exceptions: List[datetime] = []
+
+    @property
+    def end(self) -> Optional[datetime]:
+        """Upper bound of the series, None if it repeats forever."""
+        if self.repeat_until is None:
+            return None
+        return self.repeat_until + (self.until - self.since)
+
+    def occurrences(
+        self, since: datetime, until: datetime
+    ) -> Iterator[Tuple[datetime, datetime]]:
+        """Yield (since, until) of occurrences overlapping the window."""
+        return occurrences(
+            self.since,
+            self.until,
+            self.every,
+            self.repeat_until,
+            set(self.exceptions),
+            since,
+            until,
+        )
+
+    def collides_with(self, since: datetime, until: datetime) -> bool:
+        return next(self.occurrences(since, until), None) is not None
+
+    def collides_with_rule(self, other: "RecurringAppointment") -> bool:
+        ends = [e for e in (self.end, other.end) if e is not None]
+        if not ends:
+            return self._meets_forever(other)
+        # a collision can only happen while both series run, so walk the
+        # sparser one over that span
+        start = max(self.since, other.since)
+        sparse, dense = sorted(
+            (self, other), key=lambda r: r.every, reverse=True
+        )
+        return any(
+            dense.collides_with(s, u)
+            for s, u in sparse.occurrences(start, min(ends))
+        )
+
+    def _meets_forever(self, other: "RecurringAppointment") -> bool:
+        # the starts of two endless series come to differ by every multiple
+        # of the gcd of their periods, each time infinitely often, so the
+        # finitely many exceptions cannot prevent a collision
+        g = gcd(self.every // MICROSECOND, other.every // MICROSECOND)
+        step = g * MICROSECOND
+        offset = other.since - self.since
+        lo = -(other.until - other.since) - offset
+        hi = (self.until - self.since) - offset
+        # is there a multiple of step in (lo, hi)
+        return (lo // step + 1) * step < hi
+
+    def is_occurrence(self, since: datetime) -> bool:
+        k, rest = divmod(since - self.since, self.every)
+        return (
+            k >= 0
+            and not rest
+            and (self.repeat_until is None or since < self.repeat_until)
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"RecurringAppointment({self.id}, {self.from_user}, {self.since},"
+            f" {self.until}, {self.every})"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "from_user": self.from_user,
+            "since": self.since,
+            "until": self.until,
+            "description": self.description,
+            "every": self.every,
+            "repeat_until": self.repeat_until,
+            "exceptions": [e for e in self.exceptions],
+        }
@@ -3,7 +3,9 @@ from flask_jwt_extended import JWTManager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from timetable.config import get_database_uri
+from timetable.config import get_command_lanes, get_database_uri
+from timetable.service_layer.dispatcher import OutboxDispatcher
+from timetable.service_layer.executor import CalendarExecutor
 from timetable.service_layer.unit_of_work import SqlUnitOfWork
 from timetable.bootstrap import bootstrap
 
@@ -14,3 +16,5 @@ session_factory = sessionmaker(bind=engine)
 uow = SqlUnitOfWork(session_factory=session_factory)
 
 mb = bootstrap(True, uow)
+executor = CalendarExecutor(mb, get_command_lanes())
+dispatcher = OutboxDispatcher(mb, session_factory).start()
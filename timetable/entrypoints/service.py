@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
@@ -11,15 +11,19 @@ from timetable.domain.command import (
 from timetable.service_layer.views import (
     search_services,
     list_appointments,
+    list_appointments_page,
     get_appointment,
+    get_free_slots,
 )
 
-from timetable.domain.exceptions import DoesNotExistsError
-from timetable.entrypoints.deps import mb
+from timetable.domain.exceptions import DoesNotExistsError, NotAvailableError
+from timetable.entrypoints.deps import executor, mb
 
 
 service = Blueprint("service", __name__)
 
+MAX_PAGE_SIZE = 100
+
 
 @service.route("/service", methods=["GET"])
 def get_services():
@@ -28,20 +32,45 @@ def get_services():
         tags = tags.split(",")
     else:
         tags = []
-    ss = search_services(tags, mb.uow)
-    return jsonify(ss), 200
+    try:
+        since, until = parse_window()
+    except ValueError as e:
+        r = {"error": str(e)}, 400
+    else:
+        ss = search_services(tags, mb.uow, since, until)
+        r = jsonify(ss), 200
+    return r
+
+
+def parse_window():
+    """Optional since/until arguments, given together or not at all."""
+    since = request.args.get("since")
+    until = request.args.get("until")
+    if not (since or until):
+        return None, None
+    if not (since and until):
+        raise ValueError("since and until must be given together")
+    since = datetime.strptime(since, "%Y-%m-%d %H:%M")
+    until = datetime.strptime(until, "%Y-%m-%d %H:%M")
+    if since >= until:
+        raise ValueError(f"since must be before until ({since} >= {until})")
+    return since, until
 
 
 @service.route("/service/<string:account_name>/appointment", methods=["GET"])
 @jwt_required(optional=True)
 def get_appointments(account_name):
     current_identity = get_jwt_identity()
+    limit = request.args.get("limit")
 
+    if limit is not None:
+        return get_appointments_page(account_name, current_identity, limit)
     try:
+        since, until = parse_window()
         list_dict_app = list_appointments(
-            account_name, current_identity, mb.uow
+            account_name, current_identity, mb.uow, since, until
         )
-    except DoesNotExistsError as e:
+    except (DoesNotExistsError, ValueError) as e:
         r = {"error": str(e)}, 400
     else:
         for dict_app in list_dict_app:
@@ -51,6 +80,49 @@ def get_appointments(account_name):
     return r
 
 
+def get_appointments_page(account_name, current_identity, limit):
+    try:
+        limit = int(limit)
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        page = list_appointments_page(
+            account_name,
+            current_identity,
+            limit,
+            request.args.get("after"),
+            mb.uow,
+        )
+    except (DoesNotExistsError, ValueError) as e:
+        r = {"error": str(e)}, 400
+    else:
+        for dict_app in page["appointments"]:
+            dict_app["since"] = dict_app["since"].strftime("%Y-%m-%d %H:%M")
+            dict_app["until"] = dict_app["until"].strftime("%Y-%m-%d %H:%M")
+        r = jsonify(page), 200
+    return r
+
+
+@service.route("/service/<string:account_name>/free_slots", methods=["GET"])
+def get_free_slots_list(account_name):
+    try:
+        since = datetime.strptime(request.args["since"], "%Y-%m-%d %H:%M")
+        until = datetime.strptime(request.args["until"], "%Y-%m-%d %H:%M")
+        min_duration = timedelta(
+            minutes=int(request.args.get("min_duration", 0))
+        )
+        slots = get_free_slots(
+            account_name, since, until, min_duration, mb.uow
+        )
+    except (KeyError, DoesNotExistsError, ValueError) as e:
+        r = {"error": str(e)}, 400
+    else:
+        for slot in slots:
+            slot["since"] = slot["since"].strftime("%Y-%m-%d %H:%M")
+            slot["until"] = slot["until"].strftime("%Y-%m-%d %H:%M")
+        r = jsonify(slots), 200
+    return r
+
+
 @service.route(
     "/service/<string:account_name>/appointment/<int:app_id>", methods=["GET"]
 )
@@ -83,8 +155,8 @@ def post_appointment(account_name):
         j["description"],
     )
     try:
-        mb.handle(c)
-    except (DoesNotExistsError, ValueError) as e:
+        executor.handle(c)
+    except (DoesNotExistsError, NotAvailableError, ValueError) as e:
         r = {"error": str(e)}, 400
     else:
         r = {"msg": "ok"}, 201
@@ -100,8 +172,8 @@ def put_appointment(account_name, app_id):
     if current_user == account_name:
         c = AcceptAppointment(account_name, app_id)
         try:
-            mb.handle(c)
-        except DoesNotExistsError as e:
+            executor.handle(c)
+        except (DoesNotExistsError, NotAvailableError) as e:
             r = {"error": str(e)}, 400
         else:
             r = {"msg": "ok"}, 200
@@ -0,0 +1,474 @@
+"""Bulk import of users, services and appointments.
+
+Records are streamed from a JSONL or CSV file and written in batches with
+executemany, bypassing the ORM. Each record has a ``kind``:
+
+- ``client``: account_name, email, password
+- ``service``: account_name, email, password, tags (``;`` separated in CSV)
+- ``appointment``: to_user, from_user, since, until, description and
+  optionally accepted
+
+Appointments are checked per calendar against accepted appointments and
+recurring series, both those already stored and those imported before
+them; colliding or invalid records are skipped and counted as rejected.
+An accepted appointment drops the pending requests it overlaps, stored or
+imported before it, as accepting one in the calendar does.
+Only a bounded number of calendars is kept in memory, evicted ones are
+read back from the database when needed again.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Set, TextIO, Tuple
+
+from sqlalchemy import and_, bindparam, create_engine, select
+
+from timetable.adapters.orm import (
+    appointments,
+    calendars,
+    clients,
+    recurrence_exceptions,
+    recurring_appointments,
+    services,
+    tags,
+    users,
+)
+from timetable.config import get_database_uri
+from timetable.domain.appointment import Appointment
+from timetable.domain.exceptions import DoesNotExistsError, NotAvailableError
+from timetable.domain.interval import DisjointIntervalIndex, IntervalIndex
+from timetable.domain.recurrence import RecurringAppointment
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+
+# insert order, parents before children
+TABLES = (users, clients, services, tags, calendars, appointments)
+
+
+def read_jsonl(f: TextIO) -> Iterator[Record]:
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(f: TextIO) -> Iterator[Record]:
+    for row in csv.DictReader(f):
+        record = {k: v for k, v in row.items() if v not in (None, "")}
+        if "tags" in record:
+            record["tags"] = record["tags"].split(";")
+        yield record
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+class _CalendarState:
+    """What collision checks of one calendar need."""
+
+    __slots__ = ("id_count", "accepted", "pending", "recurring", "dirty")
+
+    def __init__(
+        self,
+        id_count: int,
+        accepted: DisjointIntervalIndex,
+        pending: IntervalIndex,
+        recurring: List[RecurringAppointment],
+    ):
+        self.id_count = id_count
+        self.accepted = accepted
+        self.pending = pending
+        self.recurring = recurring
+        self.dirty = False
+
+    def is_available(self, since: datetime, until: datetime) -> bool:
+        if next(self.accepted.overlapping(since, until), None) is not None:
+            return False
+        return not any(r.collides_with(since, until) for r in self.recurring)
+
+
+class BulkImporter:
+    def __init__(
+        self, engine, batch_size: int = 10000, cache_size: int = 1000
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.read = 0
+        self.written = 0
+        self.rejected = 0
+        # pending requests dropped for an accepted appointment
+        self.dropped = 0
+        self._rows: Dict[Any, List[Record]] = {t: [] for t in TABLES}
+        self._pending = 0
+        # account names queued in the current batch
+        self._new_users: Set[str] = set()
+        # calendars with rows in the current batch, not readable yet
+        self._unflushed: Set[str] = set()
+        # (owner, id) of appointments queued in the current batch, of those
+        # dropped from it again and of stored ones to delete
+        self._queued: Set[Tuple[str, int]] = set()
+        self._dropped: Set[Tuple[str, int]] = set()
+        self._deleted: List[Tuple[str, int]] = []
+        self._id_counts: Dict[str, int] = {}
+        self._calendars: "OrderedDict[str, _CalendarState]" = OrderedDict()
+        self._started = time.perf_counter()
+
+    def run(self, records: Iterable[Record]) -> "BulkImporter":
+        for record in records:
+            self.add(record)
+        self.flush()
+        return self
+
+    def add(self, record: Record) -> None:
+        self.read += 1
+        kind = record.get("kind")
+        try:
+            if kind == "client":
+                self._add_user(record, "client")
+                self._queue(clients, account_name=record["account_name"])
+            elif kind == "service":
+                self._add_service(record)
+            elif kind == "appointment":
+                self._add_appointment(record)
+            else:
+                raise ValueError(f"unknown kind {kind!r}")
+        except (
+            KeyError,
+            TypeError,
+            ValueError,
+            DoesNotExistsError,
+            NotAvailableError,
+        ) as e:
+            self.rejected += 1
+            logger.warning(f"rejected record {self.read}: {e!r}")
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _queue(self, table, **row) -> None:
+        self._rows[table].append(row)
+        self._pending += 1
+
+    def _add_user(self, record: Record, type: str) -> None:
+        account_name = record["account_name"]
+        if account_name in self._new_users:
+            raise NotAvailableError(f"{account_name} is repeated")
+        self._new_users.add(account_name)
+        self._queue(
+            users,
+            account_name=account_name,
+            email=record["email"],
+            password=record["password"],
+            type=type,
+        )
+
+    def _add_service(self, record: Record) -> None:
+        account_name = record["account_name"]
+        self._add_user(record, "service")
+        self._queue(services, account_name=account_name)
+        for tag in record.get("tags", []):
+            self._queue(tags, service_account_name=account_name, tag=tag)
+        self._queue(calendars, owner=account_name, id_count=0)
+        self._unflushed.add(account_name)
+        # the calendar starts empty, so its appointments need no flush
+        self._cache(
+            account_name,
+            _CalendarState(0, DisjointIntervalIndex(), IntervalIndex(), []),
+        )
+
+    def _add_appointment(self, record: Record) -> None:
+        self._book(
+            record["to_user"],
+            record["from_user"],
+            datetime.fromisoformat(record["since"]),
+            datetime.fromisoformat(record["until"]),
+            record["description"],
+            _flag(record.get("accepted", False)),
+        )
+
+    def _book(
+        self,
+        owner: str,
+        from_user: str,
+        since: datetime,
+        until: datetime,
+        description: str,
+        accepted: bool,
+    ) -> None:
+        c = self._calendar(owner)
+        a = Appointment(
+            c.id_count, from_user, since, until, description, accepted
+        )
+        if not c.is_available(since, until):
+            raise NotAvailableError(f"{owner} is busy from {since} to {until}")
+        if accepted:
+            for request in list(c.pending.overlapping(since, until)):
+                c.pending.remove(request)
+                self._drop(owner, request.id)
+            c.accepted.add(a)
+        else:
+            c.pending.add(a)
+        c.id_count += 1
+        c.dirty = True
+        self._queue(
+            appointments,
+            calendar_owner=owner,
+            id=a.id,
+            from_user=a.from_user,
+            since=a.since,
+            until=a.until,
+            description=a.description,
+            accepted=a.accepted,
+        )
+        self._queued.add((owner, a.id))
+        self._unflushed.add(owner)
+
+    def _drop(self, owner: str, id: int) -> None:
+        self.dropped += 1
+        if (owner, id) in self._queued:
+            self._dropped.add((owner, id))
+        else:
+            self._deleted.append((owner, id))
+
+    def _calendar(self, owner: str) -> _CalendarState:
+        c = self._calendars.get(owner)
+        if c is not None:
+            self._calendars.move_to_end(owner)
+            return c
+        if owner in self._unflushed:
+            self.flush()
+        c = self._load(owner)
+        self._cache(owner, c)
+        return c
+
+    def _cache(self, owner: str, c: _CalendarState) -> None:
+        self._calendars[owner] = c
+        if len(self._calendars) > self.cache_size:
+            evicted, old = self._calendars.popitem(last=False)
+            if old.dirty:
+                self._id_counts[evicted] = old.id_count
+
+    def _load(self, owner: str) -> _CalendarState:
+        a = appointments.c
+        ra = recurring_appointments.c
+        re = recurrence_exceptions.c
+        with self.engine.connect() as conn:
+            calendar = conn.execute(
+                select([calendars.c.id_count]).where(
+                    calendars.c.owner == owner
+                )
+            ).first()
+            if calendar is None:
+                raise DoesNotExistsError(f"calendar of {owner} does not exist")
+            accepted: List[Appointment] = []
+            pending: List[Appointment] = []
+            for row in conn.execute(
+                select(
+                    [a.id, a.from_user, a.since, a.until, a.accepted]
+                ).where(a.calendar_owner == owner)
+            ):
+                (accepted if row.accepted else pending).append(
+                    Appointment(
+                        row.id,
+                        row.from_user,
+                        row.since,
+                        row.until,
+                        "",
+                        row.accepted,
+                    )
+                )
+            recurring = {}
+            for row in conn.execute(
+                select(
+                    [ra.id, ra.since, ra.until, ra.every, ra.repeat_until]
+                ).where(ra.calendar_owner == owner)
+            ):
+                recurring[row.id] = RecurringAppointment(
+                    row.id,
+                    "",
+                    row.since,
+                    row.until,
+                    "",
+                    row.every,
+                    row.repeat_until,
+                )
+            if recurring:
+                for recurring_id, since in conn.execute(
+                    select([re.recurring_id, re.since]).where(
+                        re.calendar_owner == owner
+                    )
+                ):
+                    recurring[recurring_id].exceptions.append(since)
+        return _CalendarState(
+            calendar.id_count or 0,
+            DisjointIntervalIndex(accepted),
+            IntervalIndex(pending),
+            list(recurring.values()),
+        )
+
+    def flush(self) -> None:
+        self._collect_id_counts()
+        if not self._pending and not self._id_counts:
+            return
+        self._drop_existing_users()
+        self._collect_id_counts()
+        if self._dropped:
+            self._rows[appointments][:] = [
+                row
+                for row in self._rows[appointments]
+                if (row["calendar_owner"], row["id"]) not in self._dropped
+            ]
+        with self.engine.begin() as conn:
+            if self._deleted:
+                a = appointments.c
+                conn.execute(
+                    appointments.delete().where(
+                        and_(
+                            a.calendar_owner == bindparam("b_owner"),
+                            a.id == bindparam("b_id"),
+                        )
+                    ),
+                    [
+                        {"b_owner": owner, "b_id": id}
+                        for owner, id in self._deleted
+                    ],
+                )
+            for table, rows in self._rows.items():
+                if rows:
+                    conn.execute(table.insert(), rows)
+                    self.written += len(rows)
+            if self._id_counts:
+                conn.execute(
+                    calendars.update()
+                    .where(calendars.c.owner == bindparam("b_owner"))
+                    .values(
+                        id_count=bindparam("b_id_count"),
+                        version=calendars.c.version + 1,
+                    ),
+                    [
+                        {"b_owner": owner, "b_id_count": id_count}
+                        for owner, id_count in self._id_counts.items()
+                    ],
+                )
+        for rows in self._rows.values():
+            rows.clear()
+        self._pending = 0
+        self._new_users.clear()
+        self._unflushed.clear()
+        self._queued.clear()
+        self._dropped.clear()
+        self._deleted.clear()
+        self._id_counts.clear()
+        self.report()
+
+    def _collect_id_counts(self) -> None:
+        for owner, c in self._calendars.items():
+            if c.dirty:
+                self._id_counts[owner] = c.id_count
+                c.dirty = False
+
+    def _drop_existing_users(self) -> None:
+        names = list(self._new_users)
+        existing = set()
+        with self.engine.connect() as conn:
+            # chunked to stay below bound parameter limits
+            for start in range(0, len(names), 500):
+                end = start + 500
+                existing.update(
+                    name
+                    for name, in conn.execute(
+                        select([users.c.account_name]).where(
+                            users.c.account_name.in_(names[start:end])
+                        )
+                    )
+                )
+        if not existing:
+            return
+        self.rejected += len(existing)
+        logger.warning(f"skipped existing users {sorted(existing)}")
+        keys = {
+            users: "account_name",
+            clients: "account_name",
+            services: "account_name",
+            tags: "service_account_name",
+            calendars: "owner",
+        }
+        for table, key in keys.items():
+            self._rows[table][:] = [
+                row for row in self._rows[table] if row[key] not in existing
+            ]
+        self._rebook(existing)
+
+    def _rebook(self, owners: Set[str]) -> None:
+        # appointments of a service queued in this batch were checked
+        # against its empty calendar; where the account already existed,
+        # they are checked again against the calendar as stored
+        rows = self._rows[appointments]
+        rebooked = [row for row in rows if row["calendar_owner"] in owners]
+        rows[:] = [row for row in rows if row["calendar_owner"] not in owners]
+        for owner in owners:
+            self._unflushed.discard(owner)
+            self._calendars.pop(owner, None)
+            self._id_counts.pop(owner, None)
+        deleted = [key for key in self._deleted if key[0] not in owners]
+        self.dropped -= len(self._deleted) - len(deleted)
+        self._deleted[:] = deleted
+        for row in rebooked:
+            key = (row["calendar_owner"], row["id"])
+            self._queued.discard(key)
+            if key in self._dropped:
+                self._dropped.discard(key)
+                self.dropped -= 1
+        for row in rebooked:
+            try:
+                self._book(
+                    row["calendar_owner"],
+                    row["from_user"],
+                    row["since"],
+                    row["until"],
+                    row["description"],
+                    row["accepted"],
+                )
+            except (DoesNotExistsError, NotAvailableError) as e:
+                self.rejected += 1
+                logger.warning(f"rejected appointment {row}: {e!r}")
+
+    def report(self) -> None:
+        elapsed = time.perf_counter() - self._started
+        logger.info(
+            f"{self.read} records read, {self.written} rows written,"
+            f" {self.rejected} rejected, {self.dropped} requests dropped,"
+            f" {self.read / elapsed:.0f} records/s"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="file to import, - for stdin")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    read = read_csv if fmt == "csv" else read_jsonl
+    # psycopg2 packs each executemany into multi-row INSERT ... VALUES
+    engine = create_engine(get_database_uri(), executemany_mode="values_only")
+    importer = BulkImporter(engine, args.batch_size, args.cache_size)
+    if args.path == "-":
+        importer.run(read(sys.stdin))
+    else:
+        with open(args.path, newline="") as f:
+            importer.run(read(f))
+    return 0 if not importer.rejected else 1
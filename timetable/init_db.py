@@ -1,9 +1,52 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn
 
-from timetable.adapters.orm import metadata
-from timetable.config import get_database_uri
+from timetable.adapters.orm import (
+    NO_OVERLAP_CONSTRAINT,
+    NO_OVERLAP_DDL,
+    metadata,
+)
+from timetable.config import get_database_uri, get_exclusion_constraint
 
 
 def init_db():
     engine = create_engine(get_database_uri())
     metadata.create_all(engine)
+    upgrade_schema(engine)
+
+
+def upgrade_schema(engine):
+    """Bring a database created by an older init_db up to date.
+
+    create_all skips tables that already exist, so columns and indexes
+    added to them later are created here. New columns need a server
+    default or must be nullable.
+
+    With PG_EXCLUSION_CONSTRAINT set, the no-overlap constraint is added to
+    an existing PostgreSQL database as well; this fails while any accepted
+    appointments still overlap, which then have to be resolved by hand.
+    """
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                spec = CreateColumn(column).compile(dialect=engine.dialect)
+                engine.execute(f"ALTER TABLE {table.name} ADD COLUMN {spec}")
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+    if engine.dialect.name == "postgresql" and get_exclusion_constraint():
+        add_no_overlap_constraint(engine)
+
+
+def add_no_overlap_constraint(engine):
+    with engine.begin() as conn:
+        found = conn.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+            {"name": NO_OVERLAP_CONSTRAINT},
+        ).first()
+        if found is None:
+            for ddl in NO_OVERLAP_DDL:
+                conn.execute(ddl)
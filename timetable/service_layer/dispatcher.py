@@ -0,0 +1,125 @@
+from datetime import datetime
+from threading import Event as Flag, Thread
+from typing import Optional
+import logging
+
+from sqlalchemy import select
+
+from timetable.adapters.orm import outbox
+from timetable.adapters.outbox import deserialize, event_types
+from timetable.service_layer.message_bus import MessageBus
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Publishes the events SqlUnitOfWork wrote to the outbox table.
+
+    Pending rows are claimed in batches with FOR UPDATE SKIP LOCKED, so
+    any number of dispatchers can run side by side without publishing a
+    row twice at the same time. A row is marked processed once all its
+    handlers succeeded; otherwise it stays pending and is retried up to
+    ``max_attempts`` times, so handlers must tolerate repeated events.
+
+    Only rows of event types the bus has handlers for are read; others
+    count as failed attempts, so a dispatcher that knows them may still
+    publish them.
+    """
+
+    def __init__(
+        self,
+        mb: MessageBus,
+        session_factory,
+        batch_size: int = 100,
+        max_attempts: int = 5,
+        interval: float = 1.0,
+    ):
+        self.mb = mb
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.interval = interval
+        self._stopped = Flag()
+        self._thread: Optional[Thread] = None
+
+    def dispatch(self) -> int:
+        """Publish one batch of pending events, return how many were read."""
+        session = self.session_factory()
+        try:
+            rows = session.execute(
+                select([outbox.c.id, outbox.c.type, outbox.c.payload])
+                .where(
+                    outbox.c.processed_at.is_(None),
+                    outbox.c.attempts < self.max_attempts,
+                )
+                .order_by(outbox.c.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).fetchall()
+            types = event_types(self.mb.events_handlers)
+            done, failed = [], []
+            for row in rows:
+                ok = self._publish(row, types)
+                (done if ok else failed).append(row.id)
+            if done:
+                session.execute(
+                    outbox.update()
+                    .where(outbox.c.id.in_(done))
+                    .values(
+                        processed_at=datetime.utcnow(),
+                        attempts=outbox.c.attempts + 1,
+                    )
+                )
+            if failed:
+                session.execute(
+                    outbox.update()
+                    .where(outbox.c.id.in_(failed))
+                    .values(attempts=outbox.c.attempts + 1)
+                )
+            session.commit()
+            return len(rows)
+        finally:
+            session.close()
+
+    def _publish(self, row, types) -> bool:
+        try:
+            event = deserialize(row.type, row.payload, types)
+        except (TypeError, ValueError):
+            logger.exception(f"cannot read outbox row {row.id}")
+            return False
+        ok = True
+        for handler in self.mb.events_handlers.get(type(event), []):
+            logger.debug(f"handling event {event} with handler {handler}")
+            try:
+                handler(event)
+            except BaseException:
+                # whatever a handler raises, the attempt is recorded and
+                # the other rows and handlers still run
+                logger.exception(f"Exception handling event {event}")
+                ok = False
+        return ok
+
+    def run(self) -> None:
+        """Dispatch until stopped, waiting ``interval`` when idle."""
+        while not self._stopped.is_set():
+            try:
+                read = self.dispatch()
+            except Exception:
+                logger.exception("dispatching the outbox failed")
+                read = 0
+            if read < self.batch_size:
+                self._stopped.wait(self.interval)
+
+    def start(self) -> "OutboxDispatcher":
+        self._stopped.clear()
+        self._thread = Thread(
+            target=self.run, name="outbox-dispatcher", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
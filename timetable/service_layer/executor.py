@@ -0,0 +1,130 @@
+from concurrent.futures import Future
+from queue import SimpleQueue
+from threading import Thread
+from typing import Dict, List, Optional, Tuple, Type
+import logging
+import os
+import zlib
+
+from timetable.domain.command import (
+    AcceptAppointment,
+    CancelOccurrence,
+    Command,
+    CreateAppointment,
+    CreateAppointments,
+    CreateRecurringAppointment,
+    CreateService,
+)
+from timetable.service_layer.message_bus import MessageBus
+
+logger = logging.getLogger(__name__)
+
+# attribute naming the calendar a command changes
+CALENDAR_OWNER: Dict[Type[Command], str] = {
+    CreateAppointment: "to_user",
+    CreateAppointments: "to_user",
+    AcceptAppointment: "account_name",
+    CreateRecurringAppointment: "account_name",
+    CancelOccurrence: "account_name",
+    CreateService: "account_name",
+}
+
+
+def calendar_owner(command: Command) -> Optional[str]:
+    """Owner of the calendar a command changes, None if it changes none."""
+    attribute = CALENDAR_OWNER.get(type(command))
+    if attribute is None:
+        return None
+    return getattr(command, attribute)
+
+
+Job = Optional[Tuple[Command, Future]]
+
+
+class CalendarExecutor:
+    """Handles commands on a fixed number of worker threads (lanes).
+
+    Every calendar is hashed to one lane, so commands changing the same
+    calendar run one after another in the order they were submitted and
+    never race for its version, while commands for different calendars run
+    in parallel. Commands changing no calendar go to the first lane.
+
+    The message bus is shared by all lanes, so its unit of work must keep
+    state per thread, as SqlUnitOfWork does.
+    """
+
+    def __init__(self, mb: MessageBus, lanes: Optional[int] = None):
+        self.mb = mb
+        lanes = lanes or os.cpu_count() or 1
+        self._queues: List["SimpleQueue[Job]"] = [
+            SimpleQueue() for _ in range(lanes)
+        ]
+        self._threads = [
+            Thread(
+                target=self._work,
+                args=(q,),
+                name=f"calendar-lane-{i}",
+                daemon=True,
+            )
+            for i, q in enumerate(self._queues)
+        ]
+        self._shutdown = False
+        for t in self._threads:
+            t.start()
+
+    @property
+    def lanes(self) -> int:
+        return len(self._queues)
+
+    def lane(self, command: Command) -> int:
+        owner = calendar_owner(command)
+        if owner is None:
+            return 0
+        # crc32 is stable across processes, unlike the salted hash()
+        return zlib.crc32(owner.encode()) % self.lanes
+
+    def submit(self, command: Command) -> Future:
+        """Queue a command, the future resolves when it was handled."""
+        if self._shutdown:
+            raise RuntimeError("cannot submit after shutdown")
+        future: Future = Future()
+        self._queues[self.lane(command)].put((command, future))
+        return future
+
+    def handle(self, command: Command):
+        """Handle a command on its lane and wait for it."""
+        return self.submit(command).result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the lanes once the commands queued so far are handled."""
+        if not self._shutdown:
+            self._shutdown = True
+            for q in self._queues:
+                q.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def __enter__(self) -> "CalendarExecutor":
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def _work(self, q: "SimpleQueue[Job]") -> None:
+        while True:
+            job = q.get()
+            if job is None:
+                return
+            command, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self.mb.handle(command)
+            except BaseException as e:
+                # whatever the command raised is for its submitter to see;
+                # the lane goes on with the next command either way
+                logger.debug(f"{command} failed: {e!r}")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Dict, Type, Callable
 
 from timetable.domain.calendar import Calendar
@@ -14,13 +15,19 @@ from timetable.domain.command import (
     CreateClient,
     CreateService,
     CreateAppointment,
+    CreateAppointments,
     AcceptAppointment,
+    CreateRecurringAppointment,
+    CancelOccurrence,
 )
 
 
 def accept_appointment(aa: AcceptAppointment, uow: AbstractUnitOfWork):
     with uow:
-        c = uow.calendars.get(aa.account_name)
+        since, until = uow.calendars.get_appointment_span(
+            aa.account_name, aa.id
+        )
+        c = uow.calendars.get_for_update(aa.account_name, since, until)
         app = c.get_appointment(aa.id)
         c.accept_appointment(app)
         uow.commit()
@@ -31,11 +38,55 @@ def create_appointment(
     uow: AbstractUnitOfWork,
 ):
     with uow:
-        c = uow.calendars.get(ca.to_user)
+        c = uow.calendars.get_for_update(ca.to_user, ca.since, ca.until)
         c.create_appointment(ca.from_user, ca.since, ca.until, ca.description)
         uow.commit()
 
 
+def create_appointments(
+    ca: CreateAppointments,
+    uow: AbstractUnitOfWork,
+):
+    if not ca.appointments:
+        return
+    with uow:
+        c = uow.calendars.get_for_update(
+            ca.to_user,
+            min(since for _, since, _, _ in ca.appointments),
+            max(until for _, _, until, _ in ca.appointments),
+        )
+        c.create_appointments(ca.appointments)
+        uow.commit()
+
+
+def create_recurring_appointment(
+    cr: CreateRecurringAppointment,
+    uow: AbstractUnitOfWork,
+):
+    with uow:
+        if cr.repeat_until is None:
+            end = datetime.max
+        else:
+            end = cr.repeat_until + (cr.until - cr.since)
+        c = uow.calendars.get_for_update(cr.account_name, cr.since, end)
+        c.add_recurring_appointment(
+            cr.from_user,
+            cr.since,
+            cr.until,
+            cr.description,
+            cr.every,
+            cr.repeat_until,
+        )
+        uow.commit()
+
+
+def cancel_occurrence(co: CancelOccurrence, uow: AbstractUnitOfWork):
+    with uow:
+        c = uow.calendars.get_for_update(co.account_name)
+        c.cancel_occurrence(co.id, co.since)
+        uow.commit()
+
+
 def create_client(cc: CreateClient, uow: AbstractUnitOfWork):
     with uow:
         try:
@@ -70,7 +121,10 @@ def create_service(
 EVENT_HANDLERS: Dict[Type[Event], List[Callable]] = {}
 COMMAND_HANDLERS: Dict[Type[Command], Callable] = {
     CreateAppointment: create_appointment,
+    CreateAppointments: create_appointments,
     AcceptAppointment: accept_appointment,
+    CreateRecurringAppointment: create_recurring_appointment,
+    CancelOccurrence: cancel_occurrence,
     CreateClient: create_client,
     CreateService: create_service,
 }
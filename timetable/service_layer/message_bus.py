@@ -1,54 +1,213 @@
-from typing import Union, List, Dict, Type, Callable
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
+import asyncio
+import inspect
 import logging
+import random
+import time
+
+from sqlalchemy.util import greenlet_spawn
 
 from timetable.domain.event import Event
 from timetable.domain.command import Command
-from timetable.service_layer.unit_of_work import AbstractUnitOfWork
+from timetable.domain.exceptions import (
+    ConcurrencyError,
+    DoesNotExistsError,
+    NotAvailableError,
+)
+from timetable.service_layer.unit_of_work import (
+    AbstractAsyncUnitOfWork,
+    AbstractUnitOfWork,
+)
 
 Message = Union[Command, Event]
+U = TypeVar("U", AbstractUnitOfWork, AbstractAsyncUnitOfWork)
 
 logger = logging.getLogger(__name__)
 
+# domain exceptions do not derive from Exception
+HandlingError = (
+    Exception,
+    ConcurrencyError,
+    DoesNotExistsError,
+    NotAvailableError,
+)
+
+
+class Call(NamedTuple):
+    handler: Callable
+    message: Message
+
+
+# what handling a message asks its bus to do: run a handler call, or wait
+# for that many seconds
+Step = Union[Call, float]
+
+
+class BaseMessageBus(Generic[U]):
+    """What MessageBus and AsyncMessageBus have in common.
+
+    ``_handling`` decides the order of handler calls, the retries and what
+    happens to errors; the buses only carry out its steps, the one calling
+    and sleeping, the other awaiting.
+    """
 
-class MessageBus:
     def __init__(
         self,
-        events_handlers: Dict[Type[Event], List[Callable[[Event], None]]],
-        command_handlers: Dict[Type[Command], Callable[[Command], None]],
-        uow: AbstractUnitOfWork,
+        events_handlers: Dict[Type[Event], List[Callable[[Event], Any]]],
+        command_handlers: Dict[Type[Command], Callable[[Command], Any]],
+        uow: U,
+        max_retries: int = 3,
+        backoff: float = 0.01,
     ):
         self.events_handlers = events_handlers
         self.command_handlers = command_handlers
         self.uow = uow
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # commands rerun after a ConcurrencyError, for monitoring
+        self.retries = 0
 
-    def handle(self, message: Message):
-        queue = [message]
+    def _handling(self, message: Message) -> Generator[Step, None, None]:
+        """Steps to handle a message and the events it leads to.
+
+        An error of a Call step is thrown back in at the yield.
+        """
+        queue: Deque[Message] = deque([message])
         while queue:
-            message = queue.pop(0)
+            message = queue.popleft()
             if isinstance(message, Event):
-                self.handle_event(message, queue)
+                yield from self._handling_event(message, queue)
             elif isinstance(message, Command):
-                self.handle_command(message, queue)
+                yield from self._handling_command(message, queue)
             else:
                 raise Exception(f"{message} was not an Event or Command")
 
-    def handle_event(self, event: Event, queue: List[Message]):
+    def _handling_event(
+        self, event: Event, queue: Deque[Message]
+    ) -> Generator[Step, None, None]:
         for handler in self.events_handlers[type(event)]:
             logger.debug(f"handling event {event} with handler {handler}")
             try:
-                handler(event)
+                yield Call(handler, event)
             except Exception:
                 logger.exception(f"Exception handling event {event}")
             else:
                 queue.extend(self.uow.collect_new_events())
 
-    def handle_command(self, command: Command, queue: List[Message]):
+    def _handling_command(
+        self, command: Command, queue: Deque[Message]
+    ) -> Generator[Step, None, None]:
         logger.debug(f"handling command {command}")
         handler = self.command_handlers[type(command)]
         try:
-            handler(command)
+            yield from self._retrying(Call(handler, command))
         except Exception:
             logger.exception(f"Exception handling command {command}")
             raise
         else:
             queue.extend(self.uow.collect_new_events())
+
+    def _retrying(self, call: Call) -> Generator[Step, None, None]:
+        attempt = 0
+        while True:
+            try:
+                yield call
+                return
+            except ConcurrencyError:
+                if attempt >= self.max_retries:
+                    logger.warning(
+                        f"giving up on {call.message} after retries"
+                    )
+                    raise
+            attempt += 1
+            self.retries += 1
+            logger.info(f"retrying {call.message}, attempt {attempt}")
+            yield random.uniform(0, self.backoff * 2**attempt)
+
+
+class MessageBus(BaseMessageBus[AbstractUnitOfWork]):
+    def handle(self, message: Message):
+        steps = self._handling(message)
+        error: Optional[BaseException] = None
+        while True:
+            try:
+                step = next(steps) if error is None else steps.throw(error)
+            except StopIteration:
+                return
+            error = None
+            if isinstance(step, Call):
+                try:
+                    step.handler(step.message)
+                except HandlingError as e:
+                    error = e
+            else:
+                time.sleep(step)
+
+    def handle_many(
+        self, messages: Iterable[Message]
+    ) -> List[Optional[BaseException]]:
+        """Handle messages in one unit of work committed once at the end.
+
+        Handlers enter the unit of work again, so with a SqlUnitOfWork every
+        message runs in a savepoint and a failing one is undone alone.
+        Returns the error of every message in order, None if it succeeded.
+        """
+        errors: List[Optional[BaseException]] = []
+        with self.uow:
+            for message in messages:
+                try:
+                    self.handle(message)
+                except HandlingError as e:
+                    errors.append(e)
+                else:
+                    errors.append(None)
+            self.uow.commit()
+        return errors
+
+
+class AsyncMessageBus(BaseMessageBus[AbstractAsyncUnitOfWork]):
+    """MessageBus for asyncio.
+
+    Handlers that are coroutines are awaited. Plain functions are run in a
+    greenlet, where the blocking IO of an AsyncSqlUnitOfWork.sync is
+    awaited, so the handlers of ``handlers`` serve both buses.
+    """
+
+    async def handle(self, message: Message):
+        steps = self._handling(message)
+        error: Optional[BaseException] = None
+        while True:
+            try:
+                step = next(steps) if error is None else steps.throw(error)
+            except StopIteration:
+                return
+            error = None
+            if isinstance(step, Call):
+                try:
+                    await _call(step.handler, step.message)
+                except HandlingError as e:
+                    error = e
+            else:
+                await asyncio.sleep(step)
+
+
+async def _call(handler: Callable[[Message], Any], message: Message) -> Any:
+    result = await greenlet_spawn(handler, message)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
@@ -1,15 +1,52 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.util import greenlet_spawn
+
+from timetable.adapters.orm import outbox
+from timetable.adapters.outbox import outbox_rows
+from timetable.adapters.read_model import AbstractReadModel, SqlReadModel
 from timetable.adapters.repository import (
-    AbstractRepository,
+    AsyncSqlCalendarRepository,
+    AsyncSqlUserRepository,
+    CalendarRepository,
     UserRepository,
     SqlTrackingCalendarRepository,
     SqlTrackingUserRepository,
 )
-from timetable.domain.calendar import Calendar
+from timetable.domain.exceptions import ConcurrencyError, NotAvailableError
+
+# SQLSTATE of a violated exclusion constraint
+EXCLUSION_VIOLATION = "23P01"
+
+
+def _domain_error(e: Optional[BaseException]) -> Optional[BaseException]:
+    """Domain error a failed flush stands for, None if it is no such one."""
+    if isinstance(e, StaleDataError):
+        return ConcurrencyError("Calendar was modified concurrently")
+    if (
+        isinstance(e, IntegrityError)
+        and getattr(e.orig, "pgcode", None) == EXCLUSION_VIOLATION
+    ):
+        return NotAvailableError("Time reserved already")
+    return None
+
+
+def _loaded_in(session, calendar) -> bool:
+    # a calendar expired by an earlier commit was not touched since
+    return calendar in session and "id_count" not in inspect(calendar).unloaded
 
 
 class AbstractUnitOfWork:
-    calendars: AbstractRepository[Calendar]
+    calendars: CalendarRepository
     users: UserRepository
+    read_model: AbstractReadModel
 
     def __enter__(self):
         raise NotImplementedError
@@ -29,18 +66,246 @@ class AbstractUnitOfWork:
                 yield calendar.events.pop(0)
 
 
+class AbstractAsyncUnitOfWork:
+    """Asyncio counterpart of AbstractUnitOfWork."""
+
+    calendars: AsyncSqlCalendarRepository
+    users: AsyncSqlUserRepository
+
+    async def __aenter__(self):
+        raise NotImplementedError
+
+    async def __aexit__(self, type, value, traceback):
+        await self.rollback()
+
+    async def rollback(self):
+        raise NotImplementedError
+
+    async def commit(self):
+        raise NotImplementedError
+
+    def collect_new_events(self):
+        for calendar in self.calendars.seen:
+            while calendar.events:
+                yield calendar.events.pop(0)
+
+
+def _current_owner() -> object:
+    """The asyncio task running, or else the thread."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        # no event loop is running in this thread
+        task = None
+    return task if task is not None else threading.current_thread()
+
+
+class _SqlUnitOfWorkState:
+    __slots__ = (
+        "owner",
+        "session",
+        "calendars",
+        "users",
+        "read_model",
+        "savepoints",
+        "depth",
+    )
+
+    def __init__(self, session):
+        # tasks and threads copy the context of the one starting them, and
+        # with it the states entered there, which they must not work on
+        self.owner = _current_owner()
+        self.session = session
+        self.calendars = SqlTrackingCalendarRepository(session)
+        self.users = SqlTrackingUserRepository(session)
+        self.read_model = SqlReadModel(session)
+        self.savepoints: List[Any] = []
+        self.depth = 0
+
+
+# state of every SqlUnitOfWork entered in this context; the mapping is
+# replaced rather than changed, as copies of the context share it
+_sql_states: ContextVar[Dict["SqlUnitOfWork", _SqlUnitOfWorkState]] = (
+    ContextVar("sql_uow_states", default={})
+)
+
+
 class SqlUnitOfWork(AbstractUnitOfWork):
+    """Unit of work over one session.
+
+    Committing moves the events raised by the seen calendars to the outbox
+    table in the same transaction, for OutboxDispatcher to publish.
+
+    Entering it again while inside runs the inner block in a SAVEPOINT, so
+    the inner commit only releases the savepoint and the inner rollback
+    undoes the inner block alone; the outermost commit ends the
+    transaction.
+
+    The session and repositories live in a context variable, so threads
+    (and asyncio tasks) sharing one instance each work with their own. A
+    task or thread started inside the block does not get the session of
+    the block: it enters the unit of work afresh, with a new session.
+    """
+
     def __init__(self, session_factory):
         self.session_factory = session_factory
 
+    @property
+    def _state(self) -> Optional[_SqlUnitOfWorkState]:
+        state = _sql_states.get().get(self)
+        if state is None or state.owner is not _current_owner():
+            return None
+        return state
+
+    @property
+    def _current(self) -> _SqlUnitOfWorkState:
+        state = self._state
+        if state is None:
+            raise RuntimeError("unit of work was not entered in this context")
+        return state
+
+    @property
+    def session(self):
+        return self._current.session
+
+    @property
+    def calendars(self):
+        return self._current.calendars
+
+    @property
+    def users(self):
+        return self._current.users
+
+    @property
+    def read_model(self):
+        return self._current.read_model
+
+    @property
+    def _depth(self) -> int:
+        state = self._state
+        return 0 if state is None else state.depth
+
+    @property
+    def _savepoints(self) -> List[Any]:
+        return self._current.savepoints
+
     def __enter__(self):
-        self.session = self.session_factory()
-        self.calendars = SqlTrackingCalendarRepository(self.session)
-        self.users = SqlTrackingUserRepository(self.session)
+        if self._depth == 0:
+            # the previous session of this context is left behind, like
+            # objects loaded through it
+            states = dict(_sql_states.get())
+            states[self] = _SqlUnitOfWorkState(self.session_factory())
+            _sql_states.set(states)
+        else:
+            self._savepoints.append(self.session.begin_nested())
+        self._current.depth += 1
         return self
 
+    def __exit__(self, type, value, traceback):
+        try:
+            super().__exit__(type, value, traceback)
+        finally:
+            if self._depth > 1:
+                self._savepoints.pop()
+            self._current.depth -= 1
+        # flushes fail the same way when a query autoflushes as on commit
+        error = _domain_error(value)
+        if error is not None:
+            raise error from value
+
     def rollback(self):
-        self.session.rollback()
+        if self._depth > 1:
+            savepoint = self._savepoints[-1]
+            if savepoint.is_active:
+                savepoint.rollback()
+            # events of the undone changes must not be published, and the
+            # indexes of calendars must not keep them either
+            for calendar in self.calendars.seen:
+                calendar.events.clear()
+                calendar._reset_indexes()
+        else:
+            self.session.rollback()
 
     def commit(self):
-        self.session.commit()
+        # events are published from the outbox once this transaction (or
+        # the one of the outer block) is committed, never from here
+        events = list(self.collect_new_events())
+        if events:
+            self.session.execute(outbox.insert(), outbox_rows(events))
+        # appointments are checked against the rest of their calendar, so
+        # the calendar version is bumped even if only appointments changed
+        for calendar in self.calendars.seen:
+            if _loaded_in(self.session, calendar):
+                flag_modified(calendar, "id_count")
+        if self._depth > 1:
+            transaction = self._savepoints[-1]
+        else:
+            transaction = self.session
+        try:
+            transaction.commit()
+        except (StaleDataError, IntegrityError) as e:
+            error = _domain_error(e)
+            if error is None:
+                raise
+            self.rollback()
+            raise error from e
+        if self._depth > 1:
+            # later work of the same block stays undoable on its own
+            self._savepoints[-1] = self.session.begin_nested()
+
+
+class _GreenletSqlUnitOfWork(SqlUnitOfWork):
+    """SqlUnitOfWork that AsyncSqlUnitOfWork runs in greenlets."""
+
+    def rollback(self):
+        if self._depth > 1:
+            super().rollback()
+        else:
+            # closing rolls back whatever was not committed; unlike rollback
+            # it does not expire the loaded objects, which stay readable
+            # detached, as they cannot be loaded lazily from asyncio code
+            self.session.close()
+
+
+class AsyncSqlUnitOfWork(AbstractAsyncUnitOfWork):
+    """SqlUnitOfWork for asyncio code.
+
+    The work is done by ``sync``, a SqlUnitOfWork over the synchronous side
+    of the AsyncSessions the factory makes, run in greenlets that await its
+    IO. AsyncMessageBus runs the handlers of ``handlers`` against ``sync``
+    as well, so they serve both buses.
+
+    The session factory should make sessions with expire_on_commit=False,
+    as expired attributes cannot be loaded lazily from asyncio code.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.sync = _GreenletSqlUnitOfWork(
+            lambda: session_factory().sync_session
+        )
+
+    @property
+    def session(self):
+        return self.sync.session
+
+    @property
+    def calendars(self):
+        return AsyncSqlCalendarRepository(self.sync.calendars)
+
+    @property
+    def users(self):
+        return AsyncSqlUserRepository(self.sync.users)
+
+    async def __aenter__(self):
+        await greenlet_spawn(self.sync.__enter__)
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await greenlet_spawn(self.sync.__exit__, type, value, traceback)
+
+    async def rollback(self):
+        await greenlet_spawn(self.sync.rollback)
+
+    async def commit(self):
+        await greenlet_spawn(self.sync.commit)
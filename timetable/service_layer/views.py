@@ -1,57 +1,185 @@
-from typing import Dict, Any, List
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
+from timetable.domain.calendar import check_window, free_gaps
+from timetable.domain.exceptions import DoesNotExistsError
+from timetable.domain.recurrence import occurrences
 from timetable.service_layer.unit_of_work import AbstractUnitOfWork
 
+# Views answer from uow.read_model, so no aggregate is loaded; non-owners
+# only ever get since/until of accepted appointments.
+
+
+def _ensure_calendar(owner: str, uow: AbstractUnitOfWork) -> None:
+    if not uow.read_model.has_calendar(owner):
+        raise DoesNotExistsError(f"calendar of {owner} does not exist")
+
 
 def list_appointments(
-    of_user: str, for_user: str, uow: AbstractUnitOfWork
+    of_user: str,
+    for_user: str,
+    uow: AbstractUnitOfWork,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
 ) -> List[Dict[str, Any]]:
+    """Appointments and occurrences of recurring ones, ordered by start.
+
+    Given a window, only what overlaps [since, until) is listed. Otherwise
+    occurrences are listed up to the end of the last appointment or of the
+    first occurrence of a series, whichever is later.
+    """
+    public = for_user != of_user
+    if since is not None and until is not None:
+        check_window(since, until)
+    with uow:
+        rows = uow.read_model.list_appointments(of_user, public, since, until)
+        rules = uow.read_model.list_recurring(of_user, until)
+        if not rows and not rules:
+            _ensure_calendar(of_user, uow)
+    if since is None or until is None:
+        since = datetime.min
+        until = max(
+            [row["until"] for row in rows] + [r["until"] for r in rules],
+            default=since,
+        )
+    keyed = merge(
+        [((row["since"],), row) for row in rows],
+        *(_occurrences(rule, public, since, until) for rule in rules),
+        key=itemgetter(0),
+    )
+    return [row for _, row in keyed]
+
+
+def list_appointments_page(
+    of_user: str,
+    for_user: str,
+    limit: int,
+    after: Optional[str],
+    uow: AbstractUnitOfWork,
+) -> Dict[str, Any]:
+    """One page of ``list_appointments`` and the cursor of the next one.
+
+    ``after`` is a cursor returned with a previous page, None for the first
+    page; the returned ``next`` is None after the last page. Occurrences of
+    recurring appointments are expanded only as far as the page reaches.
+    """
+    public = for_user != of_user
+    if after is not None:
+        after = decode_cursor(after)
     with uow:
-        c = uow.calendars.get(of_user)
-        if for_user == of_user:
-            apps = [a.to_dict() for a in c.list_appointments()]
+        # one row more than asked tells whether another page follows
+        rows = uow.read_model.list_appointments_page(
+            of_user, public, limit + 1, after
+        )
+        rules = uow.read_model.list_recurring(of_user)
+        if not rows and not rules:
+            _ensure_calendar(of_user, uow)
+    since = datetime.min if after is None else after[0]
+    keyed = merge(
+        rows,
+        *(
+            (
+                (key, row)
+                for key, row in _occurrences(rule, public, since, datetime.max)
+                if after is None or key > after
+            )
+            for rule in rules
+        ),
+        key=itemgetter(0),
+    )
+    page = list(islice(keyed, limit + 1))
+    next_ = None
+    if len(page) > limit:
+        next_ = encode_cursor(*page[limit - 1][0])
+    return {"appointments": [row for _, row in page[:limit]], "next": next_}
+
+
+def _occurrences(
+    rule: Dict[str, Any], public: bool, since: datetime, until: datetime
+) -> Iterator[Tuple[Tuple[datetime, int], Dict[str, Any]]]:
+    """Listing rows of the occurrences within the window, keyed by their
+    start and the id of the recurring appointment."""
+    for start, end in occurrences(
+        rule["since"],
+        rule["until"],
+        rule["every"],
+        rule["repeat_until"],
+        rule["exceptions"],
+        since,
+        until,
+    ):
+        if public:
+            row = {"since": start, "until": end}
         else:
-            apps = [
-                _mask(a.to_dict()) for a in c.list_appointments() if a.accepted
-            ]
-        return apps
+            row = {
+                "id": rule["id"],
+                "from_user": rule["from_user"],
+                "since": start,
+                "until": end,
+                "description": rule["description"],
+                "accepted": True,
+                "recurring": True,
+            }
+        yield (start, rule["id"]), row
+
+
+def encode_cursor(since: datetime, id: int) -> str:
+    raw = f"{since.isoformat()}/{id}".encode()
+    return urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Reverse ``encode_cursor``, raising ValueError on a malformed one."""
+    since, id = urlsafe_b64decode(cursor.encode()).decode().split("/")
+    return datetime.fromisoformat(since), int(id)
 
 
 def get_user(account_name: str, uow: AbstractUnitOfWork) -> Dict[str, Any]:
     with uow:
-        u = uow.users.get(account_name)
-        return u.to_dict()
+        user = uow.read_model.get_user(account_name)
+    if user is None:
+        raise DoesNotExistsError(f"user {account_name} does not exist")
+    return user
 
 
 def search_services(
-    tags: List[str], uow: AbstractUnitOfWork
+    tags: List[str],
+    uow: AbstractUnitOfWork,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
 ) -> List[Dict[str, Any]]:
     with uow:
-        us = uow.users.list_services()
-        for t in tags:
-            us = [u for u in us if t in u.tags]
-        us_masked = [_mask_service(u.to_dict()) for u in us]
-        return us_masked
+        found = uow.users.search_by_tags(tags, since, until)
+        return [
+            {"account_name": account_name, "tags": service_tags}
+            for account_name, service_tags in found
+        ]
 
 
 def get_appointment(
     account_name: str, id: int, uow: AbstractUnitOfWork
 ) -> Dict[str, Any]:
     with uow:
-        c = uow.calendars.get(account_name)
-        app = c.get_appointment(id)
-        return app.to_dict()
+        app = uow.read_model.get_appointment(account_name, id)
+    if app is None:
+        raise DoesNotExistsError("such appointment does not exists")
+    return app
 
 
-def _mask_service(u: Dict[str, Any]) -> Dict[str, Any]:
-    masked = dict()
-    masked["account_name"] = u["account_name"]
-    masked["tags"] = u["tags"]
-    return masked
-
-
-def _mask(app: Dict[str, Any]) -> Dict[str, str]:
-    masked = dict()
-    masked["since"] = app["since"]
-    masked["until"] = app["until"]
-    return masked
+def get_free_slots(
+    account_name: str,
+    since: datetime,
+    until: datetime,
+    min_duration: timedelta,
+    uow: AbstractUnitOfWork,
+) -> List[Dict[str, Any]]:
+    check_window(since, until)
+    with uow:
+        _ensure_calendar(account_name, uow)
+        busy = merge(*uow.read_model.busy_spans(account_name, since, until))
+        slots = free_gaps(busy, since, until, min_duration)
+    return [{"since": s, "until": u} for s, u in slots]